@@ -9,6 +9,7 @@ import pandas as pd
 from fyers_apiv3 import fyersModel
 import json
 import os
+import tempfile
 from requests.adapters import HTTPAdapter
 try:
     from urllib3.util.ssl_ import create_urllib3_context
@@ -24,6 +25,58 @@ warnings.filterwarnings('ignore')
 from dotenv import load_dotenv
 load_dotenv()
 
+# A token saved today and less than this many seconds ago is reused (after one
+# profile check) instead of running the full OTP/TOTP login again
+FYERS_TOKEN_TTL = int(os.getenv('FYERS_TOKEN_TTL', 6 * 3600))
+TOKEN_FILE = "store_token.json"
+
+def load_fresh_token(client_id):
+    """Return the saved token response if it is recent and Fyers still accepts it"""
+    try:
+        mtime = os.path.getmtime(TOKEN_FILE)
+    except OSError:
+        return None
+    if datetime.fromtimestamp(mtime).date() != datetime.now().date():
+        return None
+    if time.time() - mtime >= FYERS_TOKEN_TTL:
+        return None
+    try:
+        with open(TOKEN_FILE, "r") as token_file:
+            token = json.load(token_file)
+        fyers = fyersModel.FyersModel(client_id=client_id, token=token["access_token"])
+        if fyers.get_profile().get("code") == 200:
+            return token
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Saved token could not be reused: {e}")
+    return None
+
+def save_token(token):
+    """Write the token response to TOKEN_FILE (owner read/write only) in one atomic rename"""
+    # mkstemp creates the file 0600 next to TOKEN_FILE; readers see the old file or the
+    # complete new one, never a half-written token
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(TOKEN_FILE)), prefix=".store_token.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as outfile:
+            json.dump(token, outfile, indent=4)
+        os.replace(tmp_path, TOKEN_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _login_step(session, url, payload, headers, action):
+    """POST one step of the web login; on failure log the reason and response, then raise"""
+    logger = logging.getLogger(__name__)
+    response = None
+    try:
+        response = session.post(url=url, json=payload, headers=headers, timeout=10)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to {action}: {e}")
+        if response is not None:
+            logger.error(f"Response: {response.text}")
+        raise Exception(f"Failed to {action}: {e}")
+    return response
+
 import base64
 def getEncodedString(string):
     string = str(string)
@@ -64,6 +117,11 @@ def auto_login():
     if not all([client_id, secret_key, FY_ID, TOTP_KEY, PIN]):
         raise ValueError("Missing required Fyers credentials in environment variables")
 
+    token = load_fresh_token(client_id)
+    if token is not None:
+        logger.info("Reusing saved Fyers access token")
+        return token
+
     grant_type = "authorization_code"
     response_type = "code"
     state = "sample"   
@@ -97,46 +155,28 @@ def auto_login():
 
     print("login 1")
     URL_SEND_LOGIN_OTP = "https://api-t2.fyers.in/vagator/v2/send_login_otp"
-    try:
-        res = session.post(
-            url=URL_SEND_LOGIN_OTP,
-            json={"fy_id": FY_ID, "app_id": "2"},
-            headers=headers,
-            timeout=10
-        )
-        res.raise_for_status()
-        logger.info("Successfully sent login OTP")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error in send_login_otp: {e}")
-        if 'res' in locals():
-            logger.error(f"Response: {res.text}")
-        raise Exception(f"Failed to send login OTP: {e}")
+    res = _login_step(session, URL_SEND_LOGIN_OTP, {"fy_id": FY_ID, "app_id": "2"}, headers, "send login OTP")
+    logger.info("Successfully sent login OTP")
 
     print("login 2")
     print(res) 
     
 
-    # Throttle to avoid rate limits
-    if datetime.now().second % 30 > 27:
+    # A TOTP in the last seconds of its 30 s window may expire in flight; wait only
+    # until the next window starts rather than a fixed 5 s
+    remaining = 30 - time.time() % 30
+    if remaining <= 2:
         print("Throttling for OTP timing...")
-        time.sleep(5)
+        time.sleep(remaining + 0.1)
 
     # Step 3: Verify OTP
     URL_VERIFY_OTP = "https://api-t2.fyers.in/vagator/v2/verify_otp"
-    try:
-        res2 = session.post(
-            url=URL_VERIFY_OTP,
-            json={"request_key": res.json()["request_key"], "otp": pyotp.TOTP(TOTP_KEY).now()},
-            headers=headers,
-            timeout=10
-        )
-        res2.raise_for_status()
-        logger.info("Successfully verified OTP")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error in verify_otp: {e}")
-        if 'res2' in locals():
-            logger.error(f"Response: {res2.text}")
-        raise Exception(f"Failed to verify OTP: {e}")
+    res2 = _login_step(
+        session, URL_VERIFY_OTP,
+        {"request_key": res.json()["request_key"], "otp": pyotp.TOTP(TOTP_KEY).now()},
+        headers, "verify OTP"
+    )
+    logger.info("Successfully verified OTP")
 
     # Step 4: Verify PIN
     URL_VERIFY_OTP2 = "https://api-t2.fyers.in/vagator/v2/verify_pin"
@@ -145,20 +185,8 @@ def auto_login():
         "identity_type": "pin",
         "identifier": PIN
     }
-    try:
-        res3 = session.post(
-            url=URL_VERIFY_OTP2,
-            json=payload2,
-            headers=headers,
-            timeout=10
-        )
-        res3.raise_for_status()
-        logger.info("Successfully verified PIN")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error in verify_pin: {e}")
-        if 'res3' in locals():
-            logger.error(f"Response: {res3.text}")
-        raise Exception(f"Failed to verify PIN: {e}")
+    res3 = _login_step(session, URL_VERIFY_OTP2, payload2, headers, "verify PIN")
+    logger.info("Successfully verified PIN")
 
     # Update session with access token
     session.headers.update({
@@ -180,20 +208,8 @@ def auto_login():
         "create_cookie": True
     }
 
-    try:
-        res3 = session.post(
-            url=TOKENURL,
-            json=payload3,
-            headers=headers,
-            timeout=10
-        )
-        res3.raise_for_status()
-        logger.info("Successfully obtained token")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error in token request: {e}")
-        if 'res3' in locals():
-            logger.error(f"Response: {res3.text}")
-        raise Exception(f"Failed to obtain token: {e}") 
+    res3 = _login_step(session, TOKENURL, payload3, headers, "obtain token")
+    logger.info("Successfully obtained token")
     
    # Step 6: Process auth code and generate token
     url = res3.json()['Url']
@@ -215,12 +231,7 @@ def auto_login():
         logger.info("Successfully generated access token")
 
         # Save token to file with secure permissions
-        token_file = "store_token.json"
-        with open(token_file, "w") as outfile:
-            json.dump(response, outfile, indent=4)
-
-        # Set secure file permissions (owner read/write only)
-        os.chmod(token_file, 0o600)
+        save_token(response)
 
         return response
     except Exception as e:
@@ -1,13 +1,22 @@
 import pandas as pd
 from datetime import datetime
 from fyers_apiv3 import fyersModel
+import atexit
+import importlib.util
 import json
 import os
+import queue
 import re
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
+from telegram_limiter import wait_for_chat
 
 # Load environment variables
 load_dotenv()
@@ -28,11 +37,61 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler("trading.log", mode='a')
+        # delay: the file is opened on the first record, not when the handler is built
+        logging.FileHandler("trading.log", mode='a', delay=True)
     ]
 )
 
-def send_telegram_message(message):
+# Keep-alive session so Telegram notifications reuse TCP/TLS connections
+_telegram_session = requests.Session()
+_telegram_session.mount(
+    'https://',
+    HTTPAdapter(
+        pool_connections=4, pool_maxsize=16,
+        # Only failed connects and 429s (after any Retry-After delay) are retried;
+        # a 5xx or read timeout may follow a message that was already delivered
+        max_retries=Retry(
+            total=2, read=0, other=0, backoff_factor=0.1,
+            status_forcelist=(429,), allowed_methods=None
+        )
+    )
+)
+
+# Bot API limit on the text of one sendMessage call
+TELEGRAM_MAX_LENGTH = 4096
+
+# Endpoint and fixed fields of every notification, built once
+_TELEGRAM_URL = f'https://api.telegram.org/bot{token_telegram}/sendMessage'
+_TELEGRAM_BASE = {
+    'chat_id': chat_id_telegram,
+    'parse_mode': 'HTML'  # Support basic formatting
+}
+
+def _telegram_parts(message):
+    """Split a message into sendMessage-sized parts at line breaks
+
+    Yields (text, html). Only a single line longer than the limit is cut at fixed
+    offsets; that can land inside an HTML tag or entity, so its pieces go out as
+    plain text instead of being rejected by Telegram.
+    """
+    batch, size = [], 0
+    for line in message.split('\n'):
+        if len(line) > TELEGRAM_MAX_LENGTH:
+            if batch:
+                yield '\n'.join(batch), True
+                batch, size = [], 0
+            for start in range(0, len(line), TELEGRAM_MAX_LENGTH):
+                yield line[start:start + TELEGRAM_MAX_LENGTH], False
+            continue
+        if batch and size + 1 + len(line) > TELEGRAM_MAX_LENGTH:
+            yield '\n'.join(batch), True
+            batch, size = [], 0
+        size += len(line) + (1 if batch else 0)
+        batch.append(line)
+    if batch:
+        yield '\n'.join(batch), True
+
+def _send_telegram_sync(message):
     """Send message to Telegram with proper error handling"""
     try:
         # Input validation
@@ -46,44 +105,106 @@ def send_telegram_message(message):
         elif not isinstance(message, str):
             message = str(message)
 
-        # Telegram message limit is 4096 characters
-        if len(message) > 4096:
-            message = message[:4093] + "..."
-
-        # Construct the API endpoint with proper encoding
-        url = f'https://api.telegram.org/bot{token_telegram}/sendMessage'
-        data = {
-            'chat_id': chat_id_telegram,
-            'text': message,
-            'parse_mode': 'HTML'  # Support basic formatting
-        }
+        # Telegram message limit is 4096 characters; longer text goes out in parts
+        for text, html in _telegram_parts(message):
+            if html:
+                data = {**_TELEGRAM_BASE, 'text': text}
+            else:
+                data = {'chat_id': chat_id_telegram, 'text': text}
 
-        # Make the request with timeout
-        response = requests.post(url, json=data, timeout=10)
-        response.raise_for_status()
+            # Make the request with timeout, spaced against every sender in the process
+            wait_for_chat(chat_id_telegram)
+            response = _telegram_session.post(_TELEGRAM_URL, json=data, timeout=(3, 5))
+            response.raise_for_status()
 
         logger.debug("Telegram message sent successfully")
         return True
 
     except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send Telegram message: {e}")
+        logger.error("Failed to send Telegram message: %s", e)
         return False
     except Exception as e:
-        logger.error(f"Unexpected error in send_telegram_message: {e}")
+        logger.error("Unexpected error in send_telegram_message: %s", e)
+        return False
+
+# Order notifications are delivered by a background thread so order placement never
+# waits on api.telegram.org; _send_telegram_sync spaces the sends
+TELEGRAM_QUEUE_SIZE = int(os.getenv('TELEGRAM_QUEUE_SIZE', 1000))
+TELEGRAM_DRAIN_TIMEOUT = 5
+
+_telegram_queue = queue.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+
+def send_telegram_message(message):
+    """Queue a Telegram message; returns False (and drops it) if the queue is full"""
+    try:
+        _telegram_queue.put_nowait(message)
+        return True
+    except queue.Full:
+        logger.warning("Telegram queue full, dropping message: %.100s", message)
         return False
 
+def _telegram_send_loop():
+    while True:
+        message = _telegram_queue.get()
+        _send_telegram_sync(message)
+
+def _start_telegram_sender():
+    global _telegram_queue
+    # A forked worker inherits the queue but not the thread; give it fresh ones
+    _telegram_queue = queue.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+    threading.Thread(target=_telegram_send_loop, name="helper-telegram", daemon=True).start()
+
+def _drain_telegram_queue():
+    """Send messages still queued at exit, for at most TELEGRAM_DRAIN_TIMEOUT seconds"""
+    deadline = time.monotonic() + TELEGRAM_DRAIN_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            message = _telegram_queue.get_nowait()
+        except queue.Empty:
+            break
+        _send_telegram_sync(message)
+
+_start_telegram_sender()
+os.register_at_fork(after_in_child=_start_telegram_sender)
+atexit.register(_drain_telegram_queue)
+
+# Connections kept open to the Fyers API; order workers run in parallel
+FYERS_POOL_SIZE = int(os.getenv('FYERS_POOL_SIZE', 16))
+
+# Seconds between cheap Fyers calls that keep the pooled connection from being
+# dropped as idle between alert bursts; off (0) unless configured
+FYERS_KEEPALIVE_INTERVAL = float(os.getenv('FYERS_KEEPALIVE_INTERVAL', 0))
+
+# Keep-alive calls are only made on weekdays between these IST hours (NSE
+# pre-open to MCX close); outside them no alerts are expected
+FYERS_KEEPALIVE_HOURS_IST = ((9, 0), (23, 30))
+_IST_OFFSET_S = 5 * 3600 + 30 * 60
+
+def _mount_fyers_adapter(fyers):
+    # The SDK sends everything through one requests.Session; size its pool for
+    # concurrent orders and retry only failed connects, which never reach Fyers
+    fyers.service.session.mount(
+        'https://',
+        HTTPAdapter(
+            pool_connections=1, pool_maxsize=FYERS_POOL_SIZE,
+            max_retries=Retry(total=2, read=0, status=0, backoff_factor=0.1)
+        )
+    )
+
 def initialize_fyers_client():
     """Initialize Fyers client with proper error handling"""
     try:
         with open("./store_token.json", "r") as access_token_file:
             store_tokenjson = json.load(access_token_file)
             access_token = store_tokenjson["access_token"]
-            logger.info(f"access_token: {access_token}")
+            logger.info("access_token: %s", access_token)
 
         fyers = fyersModel.FyersModel(
             client_id=client_id,
             token=access_token
         )
+        _mount_fyers_adapter(fyers)
+        fyers.service.session.hooks['response'].append(_mark_fyers_used)
 
         # Test connection
         response = fyers.get_profile()
@@ -97,15 +218,210 @@ def initialize_fyers_client():
         logger.error("Token file not found. Please run authentication first.")
         raise Exception("Authentication required. Run fyerslogin.py first.")
     except Exception as e:
-        logger.error(f"Failed to initialize Fyers client: {e}")
+        logger.error("Failed to initialize Fyers client: %s", e)
         raise
 
-# Initialize global fyers client
-fyers = initialize_fyers_client()
+# Fyers response codes for an expired or rejected access token
+FYERS_AUTH_ERROR_CODES = {-8, -15, -16, -17}
+
+# Client methods the bot trades through; these log in again when the token is rejected
+FYERS_REAUTH_METHODS = (
+    "positions", "orderbook", "place_order", "place_basket_orders",
+    "cancel_order", "cancel_basket_orders", "exit_positions"
+)
+
+_reauth_lock = threading.Lock()
+
+def refresh_fyers_token(fyers, rejected_header):
+    """Log in again and point the client at the new access token"""
+    with _reauth_lock:
+        # Another thread may already have replaced the rejected token
+        if fyers.header != rejected_header:
+            return
+        from fyerslogin import auto_login
+        fyers.token = auto_login()["access_token"]
+        fyers.header = f"{fyers.client_id}:{fyers.token}"
+        logger.info("Fyers access token refreshed")
+
+def with_reauth(fyers, method):
+    """Retry a call on the fyers client once after logging in again if the token was rejected"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        header = fyers.header
+        response = method(*args, **kwargs)
+        if isinstance(response, dict) and response.get('code') in FYERS_AUTH_ERROR_CODES:
+            logger.warning("Fyers rejected the access token (code %s), logging in again", response.get('code'))
+            try:
+                refresh_fyers_token(fyers, header)
+            except Exception as e:
+                logger.error("Fyers re-login failed: %s", e)
+                return response
+            response = method(*args, **kwargs)
+        return response
+    return wrapper
+
+# Shared client, created on first use so that processes which only import this
+# module (e.g. to preload symbol masters before forking) never log in
+_fyers = None
+_fyers_init_lock = threading.Lock()
+
+def get_fyers():
+    """Return the shared Fyers client, creating and verifying it on first use"""
+    global _fyers
+    if _fyers is None:
+        with _fyers_init_lock:
+            if _fyers is None:
+                client = initialize_fyers_client()
+                for method_name in FYERS_REAUTH_METHODS:
+                    setattr(client, method_name, with_reauth(client, getattr(client, method_name)))
+                _fyers = client
+    return _fyers
+
+# Monotonic time of the last response from the Fyers API, from any caller
+_fyers_last_used = 0.0
+
+def _mark_fyers_used(response, *args, **kwargs):
+    global _fyers_last_used
+    _fyers_last_used = time.monotonic()
+
+def _in_keepalive_hours():
+    now = time.gmtime(time.time() + _IST_OFFSET_S)
+    start, end = FYERS_KEEPALIVE_HOURS_IST
+    return now.tm_wday < 5 and start <= (now.tm_hour, now.tm_min) < end
+
+def _fyers_keepalive_loop():
+    while True:
+        time.sleep(FYERS_KEEPALIVE_INTERVAL)
+        if _fyers is None or not _in_keepalive_hours():
+            continue
+        # Any real call within the interval already kept the connection warm
+        if time.monotonic() - _fyers_last_used < FYERS_KEEPALIVE_INTERVAL:
+            continue
+        try:
+            _fyers.get_profile()
+        except Exception as e:
+            logger.debug("Fyers keep-alive failed: %s", e)
+
+def _start_fyers_keepalive():
+    if FYERS_KEEPALIVE_INTERVAL > 0:
+        threading.Thread(target=_fyers_keepalive_loop, name="fyers-keepalive", daemon=True).start()
+
+def _after_fork_fyers():
+    # Pooled sockets would be shared with the parent; a forked worker opens its own
+    if _fyers is not None:
+        _mount_fyers_adapter(_fyers)
+    _start_fyers_keepalive()
+
+_start_fyers_keepalive()
+os.register_at_fork(after_in_child=_after_fork_fyers)
+
+# Symbol lookups are stable through the day; drop them periodically so refreshed
+# symbol files and rolled expiries are picked up without a restart
+SYMBOL_CACHE_TTL = int(os.getenv('SYMBOL_CACHE_TTL', 3600))
+
+def ttl_lru_cache(maxsize, ttl):
+    """lru_cache whose entries are all discarded every ttl seconds"""
+    def decorator(func):
+        cached = lru_cache(maxsize=maxsize)(func)
+        expires_at = [time.monotonic() + ttl]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            now = time.monotonic()
+            if now >= expires_at[0]:
+                cached.cache_clear()
+                expires_at[0] = now + ttl
+            return cached(*args, **kwargs)
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+    return decorator
+
+# Column layout of the Fyers symbol master CSVs (NSE_FO.csv, MCX_COM.csv, ...)
+SYMBOL_MASTER_COLUMNS = [
+    "num", "sym des", "exch no", "lot size", "tick size", "blank",
+    "timing", "date", "Time", "symbol name",
+    "ID 1", "id 2", "token no", "symbol main name", "ISIN",
+    "strike", "option type", "pass", "none", "0", "0.0"
+]
+
+# Only the columns the lookups below read; the rest are skipped by the parser
+SYMBOL_MASTER_USECOLS = [
+    "sym des", "exch no", "lot size", "symbol name",
+    "symbol main name", "strike", "option type"
+]
+
+# Compact dtypes: small ints, and categories for the few distinct underlyings and
+# option types, instead of inferred int64 and per-row strings
+SYMBOL_MASTER_DTYPES = {
+    "exch no": "int16", "lot size": "int32", "strike": "float64",
+    "symbol main name": "category", "option type": "category"
+}
+
+# The pyarrow CSV reader is multithreaded; use it when pyarrow is installed
+SYMBOL_MASTER_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+# Expiry date as it appears in "sym des", e.g. "24 Mar 28"
+_EXPIRY_RE = re.compile(r'(\d{2} [A-Za-z]{3} \d{2})')
+
+# filename -> (mtime, DataFrame, {symbol main name: row positions}); reloaded only
+# when nfo_update rewrites the file
+_symbol_master_cache = {}
+
+def _load_symbol_master_entry(local_filename):
+    mtime = os.path.getmtime(local_filename)
+    cached = _symbol_master_cache.get(local_filename)
+    if cached is not None and cached[0] == mtime:
+        return cached
+
+    df = pd.read_csv(
+        local_filename, header=None, names=SYMBOL_MASTER_COLUMNS,
+        usecols=SYMBOL_MASTER_USECOLS, dtype=SYMBOL_MASTER_DTYPES,
+        engine=SYMBOL_MASTER_ENGINE
+    )
+    # Expiry parsed from the description once here, not on every lookup; kept as
+    # datetime64 so the date filters compare integers rather than strings
+    expiry = df["sym des"].str.extract(_EXPIRY_RE.pattern, expand=False)
+    df["expiry"] = pd.to_datetime(expiry, format="%y %b %d", errors="coerce")
+    # Hash index on the underlying so lookups avoid a boolean mask over every row
+    index = df.groupby("symbol main name", sort=False).indices
+    cached = (mtime, df, index)
+    _symbol_master_cache[local_filename] = cached
+    logger.info("Loaded symbol master %s (%s rows)", local_filename, len(df))
+    return cached
+
+def load_symbol_master(local_filename):
+    """Return the parsed symbol master CSV, reading it from disk only when it changed"""
+    return _load_symbol_master_entry(local_filename)[1]
+
+def symbol_master_rows(local_filename, symbol):
+    """Return the symbol master rows whose underlying ("symbol main name") is symbol"""
+    _, df, index = _load_symbol_master_entry(local_filename)
+    positions = index.get(symbol)
+    if positions is None:
+        return df.iloc[0:0]
+    return df.iloc[positions]
+
+# Derivative symbol masters consulted by get_future_name / getting_strike
+SYMBOL_MASTER_FILES = ("NSE_FO.csv", "MCX_COM.csv", "BSE_FO.csv")
+
+def preload_symbol_masters():
+    """Parse and index the symbol masters up front so the first trade does not pay for it"""
+    for local_filename in SYMBOL_MASTER_FILES:
+        try:
+            _load_symbol_master_entry(local_filename)
+        except Exception as e:
+            logger.warning("Could not preload %s: %s", local_filename, e)
 
-@lru_cache(maxsize=100)
 def get_future_name(symbol, exchange):
     """Get future symbol name with caching for performance"""
+    # Today's date is part of the cache key so the nearest expiry rolls over at
+    # midnight instead of being served from yesterday's entry
+    return _get_future_name(symbol, exchange, datetime.now().strftime('%Y-%m-%d'))
+
+@ttl_lru_cache(maxsize=4096, ttl=SYMBOL_CACHE_TTL)
+def _get_future_name(symbol, exchange, current_date):
     if not symbol:
         logger.error("Symbol is required")
         return None, None
@@ -115,11 +431,12 @@ def get_future_name(symbol, exchange):
         exchange_config = {
             "NSE": {"filename": "NSE_FO.csv", "exchange_no": 11},
             "MCX": {"filename": "MCX_COM.csv", "exchange_no": 30},
-            "BSE": {"filename": "BSE_FO.csv", "exchange_no": 14}
+            # 11 is the index futures segment; BSE futures rows leave option type blank
+            "BSE": {"filename": "BSE_FO.csv", "exchange_no": 11}
         }
 
         if exchange not in exchange_config:
-            logger.error(f"Unsupported exchange: {exchange}")
+            logger.error("Unsupported exchange: %s", exchange)
             return None, None
 
         config = exchange_config[exchange]
@@ -128,49 +445,42 @@ def get_future_name(symbol, exchange):
 
         # Check if file exists
         if not os.path.exists(local_filename):
-            logger.error(f"Symbol data file not found: {local_filename}")
+            logger.error("Symbol data file not found: %s", local_filename)
             return None, None
 
-        column_names = [
-            "num", "sym des", "exch no", "lot size", "tick size", "blank",
-            "timing", "date", "Time", "symbol name",
-            "ID 1", "id 2", "token no", "symbol main name", "ISIN",
-            "strike", "option type", "pass", "none", "0", "0.0"
-        ]
-
-        df = pd.read_csv(local_filename, header=None, names=column_names)
-        df = df[(df["exch no"] == exchange_no) & (df["symbol main name"] == symbol)]
+        df = symbol_master_rows(local_filename, symbol)
+        df = df[df["exch no"] == exchange_no]
 
         if df.empty:
-            logger.warning(f"No data found for symbol: {symbol} on exchange: {exchange}")
+            logger.warning("No data found for symbol: %s on exchange: %s", symbol, exchange)
             return None, None
 
-        # Extract and process dates
-        filter_date = df["sym des"].str.extract(r'(\d{2} [A-Za-z]{3} \d{2})', expand=False)
-        df.loc[:, "date"] = pd.to_datetime(filter_date, format="%y %b %d").dt.strftime('%Y-%m-%d')
-
         # Filter by current date
-        current_date = datetime.now().strftime('%Y-%m-%d')
-        df = df[df['date'] >= current_date]
+        df = df[df['expiry'] >= pd.Timestamp(current_date)]
 
         if df.empty:
-            logger.warning(f"No valid future contracts found for symbol: {symbol}")
+            logger.warning("No valid future contracts found for symbol: %s", symbol)
             return None, None
 
-        # Get the nearest expiry contract
-        first_row = df.iloc[0]
-        symbol_name = first_row['symbol name']
-        lot_size = first_row["lot size"]
+        # Get the nearest expiry contract; the file is not guaranteed to be in expiry order
+        nearest = df.loc[df['expiry'].idxmin()]
+        symbol_name = nearest['symbol name']
+        lot_size = nearest["lot size"]
 
-        logger.debug(f"Found future symbol: {symbol_name}, lot size: {lot_size}")
+        logger.debug("Found future symbol: %s, lot size: %s", symbol_name, lot_size)
         return symbol_name, lot_size
 
     except Exception as e:
-        logger.error(f"Error in get_future_name: {e}")
+        logger.error("Error in get_future_name: %s", e)
         return None, None
 
+# getting_strike result when no contract matches; callers unpack five values
+# and test the first, so misses must keep the same shape as a hit
+NO_STRIKE = (None, None, None, None, None)
+
+@ttl_lru_cache(maxsize=4096, ttl=SYMBOL_CACHE_TTL)
 def getting_strike(symbol, option_type, strike,exchnge,date):
-    print(symbol, option_type, strike, date)
+    logger.debug("getting_strike %s %s %s %s", symbol, option_type, strike, date)
     if symbol is not None:
         main_ss = symbol
         if exchnge == "NSE":
@@ -185,50 +495,41 @@ def getting_strike(symbol, option_type, strike,exchnge,date):
             elif symbol == "BKX":
                 symbol = "BANKEX"
             else:
-                print("symbol not define in code for bse kindly define  ")
-                return               
+                logger.warning("symbol not define in code for bse kindly define")
+                return NO_STRIKE
+        else:
+            logger.error("Unsupported exchange: %s", exchnge)
+            return NO_STRIKE
 
         opt_type = option_type
 
-        column_names = [
-            "num", "sym des", "exch no", "lot size", "tick size", "blank",
-            "timing", "date", "Time", "symbol name",
-            "ID 1", "id 2", "token no", "symbol main name", "ISIN", "strike", "option type", "pass", "none", "0", "0.0"
-        ]
-
-        df = pd.read_csv(local_filename, header=None, names=column_names)
+        df = symbol_master_rows(local_filename, symbol.upper())
 
-        print(type(strike))
+        logger.debug("strike type %s", type(strike))
         strike = int(strike)
-        filtered_df = df[(df["symbol main name"] == symbol.upper()) & (df["strike"] == strike) & (df["option type"] == opt_type)]
+        filtered_df = df[(df["strike"] == strike) & (df["option type"] == opt_type)]
 
         if filtered_df.empty:
-            print("No data found for the specified conditions.")
-            return None, None, None, None, None
+            logger.debug("No data found for the specified conditions.")
+            return NO_STRIKE
 
-        # Extract the desired columns and create a copy of the DataFrame
-        result_df = filtered_df[["symbol name", "lot size", "sym des", "symbol main name"]].copy()
-        
-        # Extract the date using regular expressions on the entire "sym des" column
-        filter_date = filtered_df["sym des"].str.extract(r'(\d{2} [A-Za-z]{3} \d{2})', expand=False)
-
-        # Add the extracted date as a new column "date" to the result_df DataFrame using .loc
-        result_df.loc[:, "date"] = pd.to_datetime(filter_date, format="%y %b %d").dt.strftime('%Y-%m-%d')
-        filter_date_converted = pd.to_datetime(date, format='%y-%m-%d').strftime('%Y-%m-%d')
+        # Extract the desired columns; "expiry" was parsed when the file was loaded
+        result_df = filtered_df[["symbol name", "lot size", "sym des", "symbol main name", "expiry"]]
+        filter_date_converted = pd.to_datetime(date, format='%y-%m-%d')
 
         # Filter the DataFrame by the converted date
-        result_df = result_df[result_df['date'] == filter_date_converted]
+        result_df = result_df[result_df['expiry'] == filter_date_converted]
 
         # Check if the filtered DataFrame is empty after filtering by date
         if result_df.empty:
-            print(f"Date '{date}' not found.")
-            return None, None, None, None, None
+            logger.debug("Date '%s' not found.", date)
+            return NO_STRIKE
 
-        print(result_df)
+        logger.debug("%s", result_df)
         symbols = result_df['symbol name'].tolist()
         main_symbols = result_df['symbol main name'].tolist()
         symbol_lot = result_df['lot size'].tolist()
-        exiry_date = result_df['date'].tolist()
+        exiry_date = result_df['expiry'].dt.strftime('%Y-%m-%d').tolist()
 
         first_symbol = symbols[0]
         first_main_symbol = main_symbols[0]
@@ -238,116 +539,190 @@ def getting_strike(symbol, option_type, strike,exchnge,date):
         return first_symbol, first_main_symbol, first_symbol_lot, first_expiry_date, main_ss
 
     else:
-        return None, None, None, None, None
+        return NO_STRIKE
+
+def clear_symbol_caches():
+    """Forget cached symbol master data and lookups (call after the CSVs are refreshed)"""
+    _symbol_master_cache.clear()
+    _get_future_name.cache_clear()
+    getting_strike.cache_clear()
+
+# Net positions only change when an order fills, so a very short-lived copy is shared
+# between the helpers below; every order placed or exited here drops it immediately
+POSITIONS_CACHE_TTL = float(os.getenv('POSITIONS_CACHE_TTL', 2))
+
+_positions_lock = threading.Lock()
+_positions_cache = {"value": None, "expires": 0.0, "generation": 0}
+
+def get_positions():
+    """get_fyers().positions(), reused for up to POSITIONS_CACHE_TTL seconds"""
+    with _positions_lock:
+        if _positions_cache["value"] is not None and time.monotonic() < _positions_cache["expires"]:
+            return _positions_cache["value"]
+        generation = _positions_cache["generation"]
+
+    position = get_fyers().positions()
+
+    # Only keep a successful response, and only if no order went out while fetching it
+    if isinstance(position, dict) and 'netPositions' in position:
+        with _positions_lock:
+            if _positions_cache["generation"] == generation:
+                _positions_cache["value"] = position
+                _positions_cache["expires"] = time.monotonic() + POSITIONS_CACHE_TTL
+    return position
+
+def invalidate_positions():
+    """Forget cached positions; call after anything that can change them"""
+    with _positions_lock:
+        _positions_cache["value"] = None
+        _positions_cache["generation"] += 1
+
+def index_positions(position):
+    """Group a positions response by symbol: {symbol: [netPositions entries]}"""
+    index = {}
+    for entry in position.get('netPositions') or []:
+        index.setdefault(entry['symbol'], []).append(entry)
+    return index
+
+# Fyers accepts at most this many orders per multi-order place or cancel request
+BASKET_SIZE = 10
+
+def cancel_order_ids(order_ids):
+    """Cancel pending orders, batching several ids into one multi-order request"""
+    if len(order_ids) == 1:
+        response = get_fyers().cancel_order(data={"id": order_ids[0]})
+        logger.debug("%s", response)
+        return
+    for start in range(0, len(order_ids), BASKET_SIZE):
+        batch = order_ids[start:start + BASKET_SIZE]
+        response = get_fyers().cancel_basket_orders(data=[{"id": order_id} for order_id in batch])
+        logger.debug("%s", response)
+
+def pending_order_ids(symbol=None):
+    """Return the ids of pending orders (status 6) in the order book, optionally for one symbol"""
+    response = get_fyers().orderbook()
+    logger.debug("%s", response)
+    return [
+        order.get('id') for order in response.get('orderBook', [])
+        if order.get('status') == 6 and (symbol is None or order.get('symbol') == symbol)
+    ]
 
 def cancel_orders_for_all():
-    response = fyers.orderbook()
-    trading_data = response
-    print(response)
-    filtered_data = [order for order in trading_data.get('orderBook', []) if order.get('status') == 6]
-    if not filtered_data :
-        print("All positions are closed. nothing to cancle")
+    filtered_ids = pending_order_ids()
+    if not filtered_ids:
+        logger.debug("All positions are closed. nothing to cancle")
     else:
-        filtered_ids = [order.get('id') for order in filtered_data]
-        for order_id in filtered_ids:
-            data = {"id": order_id}
-            response = fyers.cancel_order(data=data)
-            print(response) 
+        cancel_order_ids(filtered_ids)
 
 def cancel_single_order(symbol):
-    response = fyers.orderbook()
-    trading_data = response
-    print(response)
-    filtered_data = [order for order in trading_data.get('orderBook', []) if order.get('status') == 6 and order.get('symbol') == symbol]
-
-    if not filtered_data :
-        print(f"symbol {symbol} positions are closed. nothing to cancle")
+    filtered_ids = pending_order_ids(symbol)
+    if not filtered_ids:
+        logger.debug("symbol %s positions are closed. nothing to cancle", symbol)
         send_telegram_message(f"symbol {symbol} positions are closed. nothing to cancel")
     else:
-        filtered_ids = [order.get('id') for order in filtered_data]
-        for order_id in filtered_ids:
-            data = {"id": order_id}
-            response = fyers.cancel_order(data=data)
-            print(response) 
+        cancel_order_ids(filtered_ids)
 
 def exit_single_order(symbol):
-    position = fyers.positions()
-    print(position)
+    position = get_positions()
+    logger.debug("%s", position)
 
     if not position['netPositions']:
-        print("No active positions.")
+        logger.debug("No active positions.")
         return
 
-    for order in position['netPositions']:
-        if order['symbol'] == symbol and order['netQty']  != 0 :
+    for order in index_positions(position).get(symbol, ()):
+        if order['netQty'] != 0:
             # Prepare data for the exit request
             data = {
                 "id": order['id']
             }
             
             # Attempt to exit the position
-            response = fyers.exit_positions(data=data)
-            print(response)
+            response = get_fyers().exit_positions(data=data)
+            invalidate_positions()
+            logger.debug("%s", response)
             
             # Check if the exit was successful
             if response.get('code') == 200:
-                print("Successfully closed position for symbol:", symbol)
+                logger.info("Successfully closed position for symbol: %s", symbol)
                 send_telegram_message(f"Successfully closed position for symbol: {symbol}")
             else:
-                print("Failed to close position for symbol:", symbol)
-                print("Response:", response)
+                logger.warning("Failed to close position for symbol: %s", symbol)
+                logger.warning("Response: %s", response)
                 send_telegram_message(f"Failed to close position for symbol: {symbol} {response}")
             return
     
-    print("open psotion  found for symbol:", symbol)
+    logger.debug("open psotion  found for symbol: %s", symbol)
 
 
 def exit_all_order():
     data = {}
     
-    response = fyers.exit_positions(data=data)
-    print(response)  
+    response = get_fyers().exit_positions(data=data)
+    invalidate_positions()
+    logger.debug("%s", response)
     send_telegram_message(response)
 
-def placing_market(fyers,symbol,qty,buy_sell,productType):
-    data = {
+# place_order fields that are the same for every order the bot sends
+_ORDER_DEFAULTS = {
+    "stopPrice": 0,
+    "validity": "DAY",
+    "disclosedQty": 0,
+    "offlineOrder": False,
+}
+
+def market_order_data(symbol, qty, buy_sell, productType):
+    """place_order payload for a market order"""
+    return {
+            **_ORDER_DEFAULTS,
             "symbol":symbol,
             "qty":abs(qty),
             "type":2,
             "side":buy_sell,
             "productType":productType,
             "limitPrice":0,
-            "stopPrice":0,
-            "validity":"DAY",
-            "disclosedQty":0,
-            "offlineOrder":False,
             "orderTag":"RASHALGOMRKT",
         } 
+
+def placing_market(fyers,symbol,qty,buy_sell,productType):
+    data = market_order_data(symbol, qty, buy_sell, productType)
     response = fyers.place_order(data=data)
-    print(response)
+    invalidate_positions()
+    logger.debug("%s", response)
     send_telegram_message(response)
 
+def place_market_orders(orders):
+    """Place (symbol, qty, buy_sell, productType) market orders, several per multi-order request"""
+    if len(orders) == 1:
+        placing_market(get_fyers(), *orders[0])
+        return
+    for start in range(0, len(orders), BASKET_SIZE):
+        batch = orders[start:start + BASKET_SIZE]
+        response = get_fyers().place_basket_orders(data=[market_order_data(*order) for order in batch])
+        invalidate_positions()
+        logger.debug("%s", response)
+        send_telegram_message(response)
+
 def exit_half_position(symbol,match_qty):
-    position = fyers.positions()
-    print(position)  
+    position = get_positions()
+    logger.debug("%s", position)
     if not position['netPositions']:
-        print("No active positions do nothing in order half exit .")
+        logger.debug("No active positions do nothing in order half exit.")
         
-    for order in position['netPositions']:
-        if order['symbol'] == symbol :
-            if order['netQty'] > match_qty:    
-                if order['side'] == 1:
-                    print(f"buy side half exit is working {order['netQty']} match qty  {match_qty}")
-                    qty = order['netQty'] - match_qty
-                    placing_market(fyers, symbol, qty, buy_sell=-1, productType=order['productType'])
-                    
-                    print(f"buy side half exit is working exit qty with {qty} ")
-                elif order['side'] == -1:
-                    print("Sell side position open. buy trade genrated exit sell trade ")
-                    print(f"buy side half exit is working {order['netQty']} match qty  {match_qty}")
-                    qty = order['netQty'] - match_qty
-                    placing_market(fyers, symbol, qty, buy_sell=1, productType=order['productType'])
-                    print(f"sell side half exit is working exit qty with {qty} ")
+    # One exit per product type held in the symbol; sent together below
+    exits = []
+    for order in index_positions(position).get(symbol, ()):
+        if order['netQty'] > match_qty:    
+            if order['side'] == 1:
+                qty = order['netQty'] - match_qty
+                logger.info("%s buy side half exit: netQty %s match qty %s exit qty %s", symbol, order['netQty'], match_qty, qty)
+                exits.append((symbol, qty, -1, order['productType']))
+            elif order['side'] == -1:
+                qty = order['netQty'] - match_qty
+                logger.info("%s sell side half exit: netQty %s match qty %s exit qty %s", symbol, order['netQty'], match_qty, qty)
+                exits.append((symbol, qty, 1, order['productType']))
+    if exits:
+        place_market_orders(exits)
 
 
 def placing_limit(fyers,symbol,qty,limitPrice,buy_sell,order_type):
@@ -362,68 +737,78 @@ def placing_limit(fyers,symbol,qty,limitPrice,buy_sell,order_type):
         
     
     data = {
+        **_ORDER_DEFAULTS,
         "symbol":symbol,
         "qty":abs(qty),
         "type":type,
         "side":buy_sell,
         "productType":"MARGIN",
         "limitPrice":limitPrice,
-        "stopPrice":0,
-        "validity":"DAY",
-        "disclosedQty":0,
-        "offlineOrder":False,
         "orderTag":"tag1" 
     }
-    print(data)
+    logger.debug("%s", data)
     response = fyers.place_order(data=data)
-    print(response)
-    print(f"{order_type} order place {symbol}")
+    invalidate_positions()
+    logger.debug("%s", response)
+    logger.debug("%s order place %s", order_type, symbol)
     send_telegram_message(f"{order_type} order place {symbol} {response}")
 
-def order_placement_buy_side(symbol, qty, limitPrice, order_type):
-    position = fyers.positions()  # Fetch positions from fyers
-    print(position)
+# Fetches positions while the caller cancels pending orders; threads start on first use
+_positions_prefetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="positions")
+
+# Telegram note for an order placed while a position is already open, by the side of that position
+_OPEN_POSITION_NOTES = {
+    1: "Buy side position open. Will not place any order in the buy side as position is already open.",
+    -1: "Sell side position open. Sell trade generated. Exit sell trade.",
+}
+
+def _order_placement(buy_sell, symbol, qty, limitPrice, order_type):
+    """Cancel pending orders for symbol, exit an opposite position, then place a buy_sell (1/-1) order"""
+    side_name = "buy" if buy_sell == 1 else "sell"
     limitPrice = float(limitPrice)  # Ensure limit price is a float
+    # The positions fetch and the order book cancel are independent round trips
+    position_future = _positions_prefetch_pool.submit(get_positions)
     cancel_single_order(symbol)  # Cancel any existing order for the symbol
-    
-    # Check if there are no active positions at all
-    if not position['netPositions']:
-        print("No active positions.")
-        placing_limit(fyers, symbol, qty, limitPrice, buy_sell=1, order_type=order_type)
-        return
+    position = position_future.result()
+    logger.debug("%s", position)
 
-    # Pre-check if the symbol exists in net positions
-    if any(order['symbol'] == symbol for order in position['netPositions']):
-        # Iterate through net positions to handle the specific symbol
-        for order in position['netPositions']:
-            if order['symbol'] == symbol:
-                if int(order['netQty']) != 0:
-                    print(order['symbol'])
-                    if order['side'] == 1:
-                        print("Buy side position open. Will not place any order in the buy side as position is already open.")
-                        placing_limit(fyers, symbol, qty, limitPrice, buy_sell=1, order_type=order_type)
-                        send_telegram_message("Buy side position open. Will not place any order in the buy side as position is already open.")
-                    elif order['side'] == -1:
-                        print("Sell side position open. Buy trade generated. Exit sell trade.")
-                        exit_single_order(symbol)
-                        placing_limit(fyers, symbol, qty, limitPrice, buy_sell=1, order_type=order_type)
-                        send_telegram_message("Sell side position open. Sell trade generated. Exit sell trade.")
-                    else:
-                        print("No side detected.")
-                else:
-                    print("netQty == 0. Placing order in buy side.")
-                    placing_limit(fyers, symbol, qty, limitPrice, buy_sell=1, order_type=order_type)
-                break  # Exit loop after handling the matching symbol
+    exit_opposite = False
+    note = None
+    if not position['netPositions']:
+        logger.debug("No active positions.")
     else:
-        # If symbol not found, directly place the order
-        print(f"No symbol found for {symbol}. Placing order in buy side.")
-        placing_limit(fyers, symbol, qty, limitPrice, buy_sell=1, order_type=order_type)
+        # Look up the symbol's entries directly instead of scanning net positions twice
+        symbol_positions = index_positions(position).get(symbol)
+        if not symbol_positions:
+            logger.debug("No symbol found for %s. Placing order in %s side.", symbol, side_name)
+        elif int(symbol_positions[0]['netQty']) == 0:
+            logger.debug("netQty == 0. Placing order in %s side.", side_name)
+        else:
+            # Handle the first entry for the symbol
+            order = symbol_positions[0]
+            logger.debug("%s", order['symbol'])
+            note = _OPEN_POSITION_NOTES.get(order['side'])
+            if note is None:
+                logger.debug("No side detected.")
+                return
+            logger.debug(note)
+            exit_opposite = order['side'] != buy_sell
+
+    if exit_opposite:
+        exit_single_order(symbol)  # Exit the opposite position first
+    placing_limit(get_fyers(), symbol, qty, limitPrice, buy_sell=buy_sell, order_type=order_type)
+    if note is not None:
+        send_telegram_message(note)
+
+def order_placement_buy_side(symbol, qty, limitPrice, order_type):
+    _order_placement(1, symbol, qty, limitPrice, order_type)
+
+# TradingView option ticker, e.g. NIFTY240125C21500
+_OPTION_SYMBOL_RE = re.compile(r'(?P<main_symbol>\w+)(?P<date>\d{2})(?P<month>\d{2})(?P<day>\d{2})(?P<option_type>[CP])(?P<strike>\d+)')
 
+@lru_cache(maxsize=8192)
 def extract_option_details(symbol):
-    # Define the regex pattern to extract the components
-    pattern = r'(?P<main_symbol>\w+)(?P<date>\d{2})(?P<month>\d{2})(?P<day>\d{2})(?P<option_type>[CP])(?P<strike>\d+)'
-    
-    match = re.match(pattern, symbol)
+    match = _OPTION_SYMBOL_RE.match(symbol)
     
     if match:
         main_symbol = match.group('main_symbol')
@@ -442,65 +827,31 @@ def extract_option_details(symbol):
         return None
 
 def order_placement_sell_side(symbol,qty,limitPrice,order_type):
-    position = fyers.positions()
-    print(position)
-    cancel_single_order(symbol)    
-    if not position['netPositions']:
-        print("No active positions.")
-        placing_limit(fyers,symbol,abs(qty),limitPrice,buy_sell=-1,order_type=order_type)
-        return
-    
-    
-    if any(order['symbol'] == symbol for order in position['netPositions']):
-        # If the symbol exists, process the net positions
-        for order in position['netPositions']:
-            if order['symbol'] == symbol:
-                if order['netQty'] != 0:
-                    if order['side'] == 1:
-                        print("Buy side position open. Will not place any order in the buy side as position is already open.")
-                        exit_single_order(symbol)  # Exit current order
-                        placing_limit(fyers, symbol, abs(qty), limitPrice, buy_sell=-1, order_type=order_type)
-                        send_telegram_message("Buy side position open. Will not place any order in the buy side as position is already open.")
-                    elif order['side'] == -1:
-                        print("Sell side position open. Sell trade generated. Exit sell trade.")
-                        placing_limit(fyers, symbol, abs(qty), limitPrice, buy_sell=-1, order_type=order_type)
-                        send_telegram_message("Sell side position open. Sell trade generated. Exit sell trade.")
-                else:
-                    print("netQty == 0. Placing order in sell side.")
-                    placing_limit(fyers, symbol, qty, limitPrice, buy_sell=-1, order_type=order_type)
-                break  # Exit the loop as we've handled the matching symbol
-    else:
-        # If the symbol is not found, directly place the order
-        print(f"No symbol found for {symbol}. Placing order in sell side.")
-        placing_limit(fyers, symbol, qty, limitPrice, buy_sell=-1, order_type=order_type)
+    _order_placement(-1, symbol, qty, limitPrice, order_type)
 
 def exit_only_sell_trades(symbol):
-    position = fyers.positions()
-    print(position)
+    position = get_positions()
+    logger.debug("%s", position)
     if not position['netPositions']:
-        print("No active positions.")
+        logger.debug("No active positions.")
 
-    if any(order['symbol'] == symbol for order in position['netPositions']):
-        # If the symbol exists, process the net positions
-        for order in position['netPositions']:
-            if order['symbol'] == symbol:
-                if order['netQty'] != 0:
-                    if order['side'] == -1:
-                        print("Buy side position open. Will not place any order in the buy side as position is already open.")
-                        exit_single_order(symbol)  # Exit current order    
+    # Process the net positions held in this symbol
+    for order in index_positions(position).get(symbol, ()):
+        if order['netQty'] != 0:
+            if order['side'] == -1:
+                logger.debug("Buy side position open. Will not place any order in the buy side as position is already open.")
+                exit_single_order(symbol)  # Exit current order    
 
 def exit_only_buy_trades(symbol):
-    position = fyers.positions()
-    print(position)
+    position = get_positions()
+    logger.debug("%s", position)
     if not position['netPositions']:
-        print("No active positions.")
-
-    if any(order['symbol'] == symbol for order in position['netPositions']):
-        # If the symbol exists, process the net positions
-        for order in position['netPositions']:
-            if order['symbol'] == symbol:
-                if order['netQty'] != 0:
-                    if order['side'] == 1:
-                        print("Buy side position open. Will not place any order in the buy side as position is already open.")
-                        exit_single_order(symbol)  # Exit current order
+        logger.debug("No active positions.")
+
+    # Process the net positions held in this symbol
+    for order in index_positions(position).get(symbol, ()):
+        if order['netQty'] != 0:
+            if order['side'] == 1:
+                logger.debug("Buy side position open. Will not place any order in the buy side as position is already open.")
+                exit_single_order(symbol)  # Exit current order
 
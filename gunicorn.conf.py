@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+bind = f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5008)}"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+# gevent workers are not supported: on_starting imports requests/ssl in the
+# master and the helper's fork hooks start OS threads before gevent could patch
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = 120
+
+
+def on_starting(server):
+    """Refresh symbol data and the Fyers token once in the master, before workers fork"""
+    from run_waitress import initialize_app
+
+    initialize_app()
+
+    # Workers fork from the master, so parsing the symbol masters here lets them
+    # share one copy instead of each parsing its own
+    from fyres_strategy_helper import preload_symbol_masters
+
+    preload_symbol_masters()
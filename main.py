@@ -1,32 +1,77 @@
 from flask import Flask, request, jsonify, abort
+from flask.json.provider import DefaultJSONProvider
 import os
 import sys
-import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
 import logging
+import logging.handlers
 from fyres_strategy_helper import *
 from nfolistupdate import nfo_update
+from telegram_limiter import wait_for_chat
 from waitress import serve
 import csv
+import atexit
 import datetime
+import collections
+import functools
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import hashlib
 import hmac
 import redis
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load environment variables
 load_dotenv()
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Flask app initialization
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler(), logging.FileHandler("trading.log", mode="a")],
+    handlers=[logging.StreamHandler(), logging.FileHandler("trading.log", mode="a", delay=True)],
+)
+
+# Keep log I/O off request and order threads: the root logger only enqueues records
+# and a background listener writes them through the handlers configured above
+_root_logger = logging.getLogger()
+_log_handlers = list(_root_logger.handlers)
+_log_queue = queue.SimpleQueue()
+for _handler in _log_handlers:
+    _root_logger.removeHandler(_handler)
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, *_log_handlers, respect_handler_level=True
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 # Load configuration from environment
 TOKEN_TELEGRAM = os.getenv("TELEGRAM_TOKEN")
@@ -34,11 +79,160 @@ TEST3_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 FLASK_HOST = os.getenv("FLASK_HOST", "0.0.0.0")
 FLASK_PORT = int(os.getenv("FLASK_PORT", 5008))
 
+# Telegram batching: status lines are coalesced per chat and flushed every
+# TELEGRAM_BATCH_INTERVAL seconds or once more than TELEGRAM_BATCH_MAX are pending
+TELEGRAM_BATCH_INTERVAL = float(os.getenv("TELEGRAM_BATCH_INTERVAL", 0.5))
+TELEGRAM_BATCH_MAX = int(os.getenv("TELEGRAM_BATCH_MAX", 3))
+
+# Outgoing Telegram messages waiting for the background sender
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", 1000))
+
+# Worker pool that runs CSV persistence and order execution off the request thread
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", 8))
+
+# Identical webhook bodies seen again within this many seconds are treated as redeliveries
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", 60))
+
+# Optional shared secret; when set, webhooks must carry a hex HMAC-SHA256 of the raw
+# body in the X-Webhook-Signature header
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+_WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode("utf-8") if WEBHOOK_SECRET else None
+
+# Largest request body accepted; larger ones get a 413 before the body is read
+MAX_WEBHOOK_BYTES = int(os.getenv("MAX_WEBHOOK_BYTES", 16384))
+app.config["MAX_CONTENT_LENGTH"] = MAX_WEBHOOK_BYTES
+
 # Validate required environment variables
 if not all([TOKEN_TELEGRAM, TEST3_CHAT_ID]):
     raise ValueError("Missing required environment variables. Check .env file.")
 
 
+# CSV headers for the daily trade files - NEW FORMAT
+CSV_HEADERS = [
+    "exchange",
+    "symbol",
+    "buyfut",
+    "action",
+    "contracts",
+    "position_size",
+    "close_price",
+    "order_type",
+    "time_utc",
+    "time_ist",
+    "source",
+    "status",
+]
+
+# Daily trade CSVs live here; created once at import with proper permissions
+CSV_DIR = "data"
+os.makedirs(CSV_DIR, mode=0o755, exist_ok=True)
+
+# Append handle for the current day's CSV, kept open across webhooks
+_csv_lock = threading.Lock()
+_csv_state = {"date": None, "file": None, "writer": None, "unsynced": 0, "last_fsync": 0.0}
+
+# The open day file is fsynced once this many seconds or rows have built up since
+# the last fsync, rather than after every batch; rotation and shutdown always fsync
+CSV_FSYNC_INTERVAL = float(os.getenv("CSV_FSYNC_INTERVAL", 5))
+CSV_FSYNC_ROWS = int(os.getenv("CSV_FSYNC_ROWS", 100))
+
+
+def _get_csv_writer(date_str):
+    """Return the CSV writer for date_str, rotating the file at day change (caller holds _csv_lock)"""
+    if _csv_state["date"] == date_str:
+        return _csv_state["writer"]
+
+    _close_csv_file()
+
+    file_name = os.path.join(CSV_DIR, f"{date_str}.csv")
+
+    is_new = not os.path.exists(file_name)
+    file = open(file_name, mode="a", buffering=65536, newline="", encoding="utf-8")
+    writer = csv.writer(file)
+    if is_new:
+        writer.writerow(CSV_HEADERS)
+        # Set secure file permissions once, when the file is created
+        os.chmod(file_name, 0o640)
+
+    _csv_state.update(date=date_str, file=file, writer=writer)
+    return writer
+
+
+def _sync_csv_file():
+    """fsync the open day file and restart the fsync cadence (caller holds _csv_lock)"""
+    os.fsync(_csv_state["file"].fileno())
+    _csv_state.update(unsynced=0, last_fsync=time.monotonic())
+
+
+def _close_csv_file():
+    file = _csv_state["file"]
+    if file is not None:
+        # Rotation at midnight closes a file the current batch may have written to;
+        # make those rows durable too, not just the new day's file
+        file.flush()
+        _sync_csv_file()
+        file.close()
+    _csv_state.update(date=None, file=None, writer=None)
+
+
+# Rows waiting for the background CSV writer, as (date_str, row) pairs
+CSV_BATCH_MAX = 64
+_csv_queue = queue.Queue()
+
+
+def _write_csv_batch(batch):
+    """Append queued rows with one writerows per day file and a single flush"""
+    with _csv_lock:
+        for date_str, items in itertools.groupby(batch, key=lambda item: item[0]):
+            _get_csv_writer(date_str).writerows(row for _, row in items)
+        _csv_state["file"].flush()
+        _csv_state["unsynced"] += len(batch)
+        if (
+            _csv_state["unsynced"] >= CSV_FSYNC_ROWS
+            or time.monotonic() - _csv_state["last_fsync"] >= CSV_FSYNC_INTERVAL
+        ):
+            _sync_csv_file()
+
+
+def _csv_writer_loop():
+    while True:
+        try:
+            batch = [_csv_queue.get(timeout=CSV_FSYNC_INTERVAL)]
+        except queue.Empty:
+            # Quiet spell: make rows written since the last fsync durable
+            with _csv_lock:
+                if _csv_state["unsynced"]:
+                    _sync_csv_file()
+            continue
+        while len(batch) < CSV_BATCH_MAX:
+            try:
+                batch.append(_csv_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_csv_batch(batch)
+        except Exception as e:
+            logger.error("Failed to write %d CSV rows: %s", len(batch), e)
+
+
+def _shutdown_csv_writer():
+    """Write rows still queued at exit, then close the day file"""
+    batch = []
+    while True:
+        try:
+            batch.append(_csv_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        _write_csv_batch(batch)
+    with _csv_lock:
+        _close_csv_file()
+
+
+threading.Thread(target=_csv_writer_loop, name="csv-writer", daemon=True).start()
+atexit.register(_shutdown_csv_writer)
+
+
 def save_to_csv(parsed_data):
     """Save trading data to CSV with proper validation and error handling - NEW FORMAT"""
     try:
@@ -63,13 +257,8 @@ def save_to_csv(parsed_data):
             if field not in parsed_data:
                 raise ValueError(f"Missing required field: {field}")
 
-        # Ensure the 'data' directory exists with proper permissions
-        folder_name = "data"
-        os.makedirs(folder_name, mode=0o755, exist_ok=True)
-
         # Define the filename with today's date
         date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-        file_name = os.path.join(folder_name, f"{date_str}.csv")
 
         # Sanitize data for CSV
         def sanitize_value(value):
@@ -95,61 +284,192 @@ def save_to_csv(parsed_data):
             "pending",  # Default status
         ]
 
-        # Define the CSV headers - NEW FORMAT
-        headers = [
-            "exchange",
-            "symbol",
-            "buyfut",
-            "action",
-            "contracts",
-            "position_size",
-            "close_price",
-            "order_type",
-            "time_utc",
-            "time_ist",
-            "source",
-            "status",
-        ]
-
-        # Write the row to the CSV file
-        write_header = not os.path.exists(file_name)
-        with open(file_name, mode="a", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            if write_header:
-                writer.writerow(headers)
-            writer.writerow(row)
-
-        # Set secure file permissions
-        os.chmod(file_name, 0o640)
+        # Hand the row to the background writer; disk I/O stays off the trade path
+        _csv_queue.put((date_str, row))
 
-        logger.info(f"Data saved to {file_name}")
+        logger.info("Data queued for %s.csv", date_str)
         return True
 
     except Exception as e:
-        logger.error(f"Failed to save CSV data: {e}")
+        logger.error("Failed to save CSV data: %s", e)
         return False
 
 
-def send_telegram_message(message, chat_id):
+# Shared Telegram session so TCP/TLS connections to api.telegram.org are reused
+TELEGRAM_URL = f"https://api.telegram.org/bot{TOKEN_TELEGRAM}/sendMessage"
+TELEGRAM_TIMEOUT = (3, 5)  # (connect, read) seconds
+TELEGRAM_MAX_LENGTH = 4096  # Bot API limit per sendMessage
+
+_tg_session = requests.Session()
+_tg_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        # sendMessage is not idempotent: retry only failed connects and 429s
+        # (urllib3 waits out Retry-After); a 5xx or read timeout may mean the
+        # message was already delivered
+        max_retries=Retry(
+            total=2,
+            read=0,
+            other=0,
+            backoff_factor=0.2,
+            status_forcelist=(429,),
+            allowed_methods=None,
+        ),
+    ),
+)
+
+
+def _send_telegram_now(message, chat_id):
     """Send a message to Telegram via the Bot API."""
     if isinstance(message, bytes):  # If it's bytes, decode it
         message = message.decode("utf-8")
     elif not isinstance(message, str):  # If it's some other type, convert it
         message = str(message)
 
-    formatted_message = urllib.parse.quote_plus(message)  # Ensure this gets a string
-    send_text = f"https://api.telegram.org/bot{TOKEN_TELEGRAM}/sendMessage?chat_id={chat_id}&text={formatted_message}"
-
     try:
-        response = requests.get(send_text)
+        # Spaced against every sender in the process, not just this module's
+        wait_for_chat(chat_id)
+        response = _tg_session.post(
+            TELEGRAM_URL,
+            data={"chat_id": chat_id, "text": message},
+            timeout=TELEGRAM_TIMEOUT,
+        )
         response.raise_for_status()  # Raise an exception for HTTP errors
-        logging.info("Message sent successfully")
+        logger.info("Message sent successfully")
         return True
     except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to send message. Error: {str(e)}")
+        logger.error("Failed to send message. Error: %s", e)
+        return False
+
+
+_tg_queue = queue.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+
+
+def send_telegram_message(message, chat_id):
+    """Queue a message for the background Telegram sender; never blocks the caller"""
+    try:
+        _tg_queue.put_nowait((message, chat_id))
+        return True
+    except queue.Full:
+        logger.warning("Telegram queue full, dropping message: %.100s", message)
         return False
 
 
+def _tg_send_loop():
+    while True:
+        message, chat_id = _tg_queue.get()
+        try:
+            _send_telegram_now(message, chat_id)
+        except Exception as e:
+            logger.error("Telegram sender error: %s", e)
+
+
+threading.Thread(target=_tg_send_loop, name="telegram-sender", daemon=True).start()
+
+
+# Telegram verbosity: "error" sends only failures, "trade" adds command and order
+# notices, "debug" also sends the received/parsed/processed chatter
+_TELEGRAM_LEVELS = {"debug": 0, "trade": 1, "error": 2}
+TELEGRAM_VERBOSITY = os.getenv("TELEGRAM_VERBOSITY", "debug").lower()
+_TELEGRAM_MIN_LEVEL = _TELEGRAM_LEVELS.get(TELEGRAM_VERBOSITY, 0)
+
+_tg_buffer = collections.defaultdict(list)
+_tg_lock = threading.Lock()
+
+
+def _tg_enabled(level):
+    """True if lines at this level are sent; lets callers skip building previews"""
+    return _TELEGRAM_LEVELS[level] >= _TELEGRAM_MIN_LEVEL
+
+
+def _tg_enqueue(chat_id, text, level="trade"):
+    """Buffer a Telegram status line; flushes early once the batch is full"""
+    if not _tg_enabled(level):
+        return
+    with _tg_lock:
+        pending = _tg_buffer[chat_id]
+        pending.append(text)
+        full = len(pending) > TELEGRAM_BATCH_MAX
+    if full:
+        _tg_flush(chat_id)
+
+
+def _tg_flush(chat_id=None):
+    """Send buffered lines as one message per chat (all chats if chat_id is None)"""
+    with _tg_lock:
+        if chat_id is None:
+            batches = dict(_tg_buffer)
+            _tg_buffer.clear()
+        else:
+            batches = {chat_id: _tg_buffer.pop(chat_id, [])}
+
+    for batch_chat_id, lines in batches.items():
+        for text in _tg_join(lines):
+            send_telegram_message(text, chat_id=batch_chat_id)
+
+
+def _tg_join(lines):
+    """Join buffered lines into as few messages as fit within TELEGRAM_MAX_LENGTH"""
+    batch, size = [], 0
+    for text in lines:
+        text = str(text)
+        # An oversized line (e.g. a long error) is sent in pieces rather than cut off
+        for start in range(0, max(len(text), 1), TELEGRAM_MAX_LENGTH):
+            line = text[start:start + TELEGRAM_MAX_LENGTH]
+            if batch and size + 1 + len(line) > TELEGRAM_MAX_LENGTH:
+                yield "\n".join(batch)
+                batch, size = [], 0
+            size += len(line) + (1 if batch else 0)
+            batch.append(line)
+    if batch:
+        yield "\n".join(batch)
+
+
+def _preview(data, limit=300):
+    """Short JSON preview of a payload for notifications; orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str)[:limit].decode("utf-8", "ignore")
+    return str(data)[:limit]
+
+
+# Sends to the default chat through the batcher; binds chat_id once instead of at
+# every call site
+_notify = functools.partial(_tg_enqueue, TEST3_CHAT_ID)
+
+
+def _tg_flush_loop():
+    while True:
+        time.sleep(TELEGRAM_BATCH_INTERVAL)
+        try:
+            _tg_flush()
+        except Exception as e:
+            logger.error("Failed to flush Telegram batch: %s", e)
+
+
+threading.Thread(target=_tg_flush_loop, name="telegram-batch", daemon=True).start()
+
+
+# Upper bound on how long shutdown waits to deliver pending Telegram messages
+TELEGRAM_DRAIN_TIMEOUT = 5
+
+
+def _drain_telegram():
+    """Deliver whatever is still buffered or queued when the process exits"""
+    _tg_flush()
+    deadline = time.monotonic() + TELEGRAM_DRAIN_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            message, chat_id = _tg_queue.get_nowait()
+        except queue.Empty:
+            break
+        _send_telegram_now(message, chat_id)
+
+
+atexit.register(_drain_telegram)
+
+
 def validate_json_payload(data):
     """Validate JSON payload structure"""
     if not isinstance(data, dict):
@@ -186,40 +506,52 @@ def validate_json_payload(data):
     return True
 
 
+# IST is UTC+05:30
+_IST_OFFSET_S = 5 * 3600 + 30 * 60
+_IST_OFFSET = datetime.timedelta(seconds=_IST_OFFSET_S)
+
+# Trailing contract digits and "!" on a continuous futures ticker (e.g. NIFTY1!)
+_FUT_SUFFIX_CHARS = "0123456789!"
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_ticker(symbol_raw):
+    """Split a TradingView ticker into (symbol, buyfut); "!" marks a continuous future"""
+    if symbol_raw.endswith("!"):
+        return symbol_raw.rstrip(_FUT_SUFFIX_CHARS), 1
+    # For options/other instruments
+    return symbol_raw.rstrip("!."), 0
+
+
 def parse_json_message(json_data):
     """Parse JSON trading message with proper validation and error handling - NEW FORMAT"""
     try:
-        # Validate the payload structure
-        validate_json_payload(json_data)
-
-        # Check if the tag contains "radhe algo"
-        tag = json_data["meta"].get("tag", "").lower()
-        if "radhe" not in tag or "algo" not in tag:
+        # Check if the tag contains "radhe algo" before the full schema walk,
+        # since most non-trading payloads are rejected here
+        meta = json_data.get("meta") if isinstance(json_data, dict) else None
+        tag = str(meta.get("tag", "")).lower() if isinstance(meta, dict) else ""
+        if not all(keyword in tag for keyword in _TRADE_KEYWORDS):
             logger.info("Message does not contain required keywords in tag")
             return None
 
+        # Validate the payload structure
+        validate_json_payload(json_data)
+
         result = {}
+        # Sub-objects are looked up once; validate_json_payload guarantees them
+        symbol = json_data["symbol"]
+        strategy = json_data["strategy"]
 
         # Extract exchange and symbol
-        result["exchange"] = json_data["symbol"]["exchange"]
-        symbol_raw = json_data["symbol"]["ticker"]
-
-        # Process the symbol to determine if it's futures
-        # Check if symbol ends with ! or if it's explicitly marked
-        if symbol_raw.endswith("!"):
-            result["symbol"] = re.sub(r"[\d!]+$", "", symbol_raw)
-            result["buyfut"] = 1
-        else:
-            # For options/other instruments
-            result["symbol"] = symbol_raw
-            result["buyfut"] = 0
+        result["exchange"] = symbol["exchange"]
+        result["symbol"], result["buyfut"] = _parse_ticker(symbol["ticker"])
 
         # NEW: Extract action (buy/sell), contracts, and position_size
-        result["action"] = json_data["strategy"]["action"].strip().lower()
+        result["action"] = strategy["action"].strip().lower()
 
         try:
-            result["contracts"] = int(json_data["strategy"]["contracts"])
-            result["position_size"] = int(json_data["strategy"]["position_size"])
+            result["contracts"] = int(strategy["contracts"])
+            result["position_size"] = int(strategy["position_size"])
         except (ValueError, TypeError):
             logger.error("Invalid contracts or position_size format")
             return None
@@ -232,29 +564,35 @@ def parse_json_message(json_data):
             return None
 
         # Extract order type (default to MKT if not specified)
-        result["order_type"] = json_data["meta"].get("order_type", "MKT").upper()
+        result["order_type"] = meta.get("order_type", "MKT").upper()
 
         # Handle time fields - use current time if not provided
-        current_utc = datetime.datetime.utcnow()
-        result["time_utc"] = current_utc.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        ist_time = current_utc + datetime.timedelta(hours=5, minutes=30)
-        result["time_ist"] = ist_time.strftime("%Y-%m-%dT%H:%M:%S")
+        now = time.time()
+        result["time_utc"] = "%04d-%02d-%02dT%02d:%02d:%02dZ" % time.gmtime(now)[:6]
+        result["time_ist"] = "%04d-%02d-%02dT%02d:%02d:%02d" % time.gmtime(now + _IST_OFFSET_S)[:6]
 
         # Extract source for tracking
-        result["source"] = json_data["meta"].get("source", "")
+        result["source"] = meta.get("source", "")
 
-        logger.info(f"Successfully parsed JSON message: {result}")
+        logger.info("Successfully parsed JSON message: %s", result)
         return result
 
     except ValueError as e:
-        logger.error(f"Validation error in JSON message: {e}")
+        logger.error("Validation error in JSON message: %s", e)
         return None
     except Exception as e:
-        logger.error(f"Error parsing JSON message: {e}")
+        logger.error("Error parsing JSON message: %s", e)
         return None
 
 
+# Basic sanitization - script tags and other potentially dangerous content,
+# folded into one alternation so the message is scanned once
+_DANGEROUS_RE = re.compile(
+    r"<script[^>]*>.*?</script>|javascript:|vbscript:|onload=|onerror=",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
 def validate_input_message(message):
     """Validate and sanitize input message"""
     if not message:
@@ -267,55 +605,52 @@ def validate_input_message(message):
     if len(message) > 10000:
         raise ValueError("Message too long")
 
-    # Basic sanitization - remove potential script tags and other dangerous content
-    dangerous_patterns = [
-        r"<script[^>]*>.*?</script>",
-        r"javascript:",
-        r"vbscript:",
-        r"onload=",
-        r"onerror=",
-    ]
-
-    for pattern in dangerous_patterns:
-        if re.search(pattern, message, re.IGNORECASE):
-            raise ValueError("Message contains potentially dangerous content")
+    if _DANGEROUS_RE.search(message):
+        raise ValueError("Message contains potentially dangerous content")
 
     return message
 
 
+# Keywords every trading alert carries; anything without them is never parsed
+_TRADE_KEYWORDS = ("radhe", "algo")
+
+# "filled on EXCHANGE:SYMBOL" part of a TradingView fill alert
+_FILLED_ON_RE = re.compile(r"filled on (\S+):(\S+)")
+_POSITION_RE = re.compile(r"New strategy position is ([\-\d]+)")
+_COMMENT_RE = re.compile(r"comment\s*=\s*([^\n]+)", re.IGNORECASE)
+_OPEN_PRICE_RE = re.compile(r"open\s*:\s*([\d.]+)")
+_ORDER_TYPE_RE = re.compile(r"order_type\s*:\s*(\S+)", re.IGNORECASE)
+_TIME_RE = re.compile(r"time\s*:\s*([\d\-T:Z]+)")
+_INTERVAL_RE = re.compile(r"interval\s*:\s*(\S+)")
+
+
 def parse_message(message):
     """Parse trading message with proper validation and error handling (Legacy text format)"""
     try:
-        # Validate input
-        message = validate_input_message(message)
-
-        # Check if both required keywords are in the message
-        if "radhe" not in message.lower() or "algo" not in message.lower():
+        # Check if both required keywords are in the message before the
+        # sanitising regex scan, so non-trading text is rejected cheaply
+        message_lower = str(message).lower() if message else ""
+        if not all(keyword in message_lower for keyword in _TRADE_KEYWORDS):
             logger.info("Message does not contain required keywords")
             return None
 
+        # Validate input
+        message = validate_input_message(message)
+
         # Extract data with better error handling
         result = {}
 
         # Extract exchange and symbol
-        filled_on_match = re.search(r"filled on (\S+):(\S+)", message)
+        filled_on_match = _FILLED_ON_RE.search(message)
         if filled_on_match:
             result["exchange"] = filled_on_match.group(1)
-            symbol_raw = filled_on_match.group(2)
-
-            # Process the symbol
-            if symbol_raw.endswith("!"):
-                result["symbol"] = re.sub(r"[\d!]+$", "", symbol_raw)
-                result["buyfut"] = 1
-            else:
-                result["symbol"] = re.sub(r"[!.]+$", "", symbol_raw)
-                result["buyfut"] = 0
+            result["symbol"], result["buyfut"] = _parse_ticker(filled_on_match.group(2))
         else:
             logger.warning("Could not extract exchange/symbol from message")
             return None
 
         # Extract position
-        position_match = re.search(r"New strategy position is ([\-\d]+)", message)
+        position_match = _POSITION_RE.search(message)
         if position_match:
             result["position_size"] = position_match.group(1)
         else:
@@ -323,12 +658,12 @@ def parse_message(message):
             return None
 
         # Extract comment
-        comment_match = re.search(r"comment\s*=\s*([^\n]+)", message, re.IGNORECASE)
+        comment_match = _COMMENT_RE.search(message)
         if comment_match:
             result["comment"] = comment_match.group(1).strip()[:100]  # Limit length
 
         # Extract open price
-        open_price_match = re.search(r"open\s*:\s*([\d.]+)", message)
+        open_price_match = _OPEN_PRICE_RE.search(message)
         if open_price_match:
             try:
                 result["open_price"] = float(open_price_match.group(1))
@@ -336,24 +671,28 @@ def parse_message(message):
                 logger.warning("Invalid open price format")
 
         # Extract order type
-        order_type_match = re.search(r"order_type\s*:\s*(\S+)", message, re.IGNORECASE)
+        order_type_match = _ORDER_TYPE_RE.search(message)
         if order_type_match:
             result["order_type"] = order_type_match.group(1)[:20]  # Limit length
 
         # Extract time
-        time_match = re.search(r"time\s*:\s*([\d\-T:Z]+)", message)
+        time_match = _TIME_RE.search(message)
         if time_match:
             time_utc = time_match.group(1)
             try:
-                utc_time = datetime.datetime.strptime(time_utc, "%Y-%m-%dT%H:%M:%SZ")
-                ist_time = utc_time + datetime.timedelta(hours=5, minutes=30)
+                # fromisoformat is a C fast path; strptime goes through the
+                # pure-Python _strptime module on every alert.
+                if len(time_utc) != 20 or time_utc[-1] != "Z":
+                    raise ValueError(time_utc)
+                utc_time = datetime.datetime.fromisoformat(time_utc[:-1])
+                ist_time = utc_time + _IST_OFFSET
                 result["time_utc"] = time_utc
                 result["time_ist"] = ist_time.strftime("%Y-%m-%dT%H:%M:%S")
             except ValueError:
                 logger.warning("Invalid time format")
 
         # Extract interval
-        interval_match = re.search(r"interval\s*:\s*(\S+)", message)
+        interval_match = _INTERVAL_RE.search(message)
         if interval_match:
             result["interval"] = interval_match.group(1)[:20]  # Limit length
 
@@ -363,19 +702,102 @@ def parse_message(message):
             logger.warning("Missing required fields in parsed message")
             return None
 
-        logger.info(f"Successfully parsed message: {result}")
+        logger.info("Successfully parsed message: %s", result)
         return result
 
     except Exception as e:
-        logger.error(f"Error parsing message: {e}")
+        logger.error("Error parsing message: %s", e)
         return None
 
 
+# One lock per traded symbol: the order helpers read positions from Fyers and then
+# act on them, so two signals for the same symbol must not interleave
+_symbol_locks = collections.defaultdict(threading.Lock)
+_symbol_locks_guard = threading.Lock()
+
+
+def _symbol_lock(symbol):
+    with _symbol_locks_guard:
+        return _symbol_locks[symbol]
+
+
+def _exit_all_action(symbol, qty, price, order_type):
+    logger.debug("exit single order called")
+    exit_single_order(symbol)
+
+
+def _exit_short_action(symbol, qty, price, order_type):
+    exit_only_sell_trades(symbol=symbol)
+
+
+def _exit_long_action(symbol, qty, price, order_type):
+    exit_only_buy_trades(symbol=symbol)
+
+
+def _short_entry_action(symbol, qty, price, order_type):
+    logger.debug("short entry called")
+    order_placement_sell_side(
+        symbol=symbol, qty=qty, limitPrice=price, order_type=order_type
+    )
+
+
+def _long_entry_action(symbol, qty, price, order_type):
+    logger.debug("long entry called")
+    order_placement_buy_side(
+        symbol=symbol, qty=qty, limitPrice=price, order_type=order_type
+    )
+
+
+def _half_exit_action(symbol, qty, price, order_type):
+    logger.debug("half qty exit called")
+    exit_half_position(symbol=symbol, match_qty=qty)
+
+
+# Strategy comment (matched exactly) -> order action
+_COMMENT_ACTIONS = {
+    "exit all ": _exit_all_action,
+    "Short Entry": _short_entry_action,
+    "Long Entry": _long_entry_action,
+}
+_COMMENT_ACTIONS.update(
+    dict.fromkeys(
+        [
+            "Remaining Short Exit",
+            "Stop Loss Short",
+            "Short SL",
+            "Short TP",
+            "Short BE",
+            "Short Exit",
+            "Close entry(s) order Short Entry",
+        ],
+        _exit_short_action,
+    )
+)
+_COMMENT_ACTIONS.update(
+    dict.fromkeys(
+        [
+            "Stop Loss Long Exit",
+            "Remaining Long Exit",
+            "Long SL",
+            "Long TP",
+            "Long BE",
+            "Long Exit",
+            "Close entry(s) order Long Entry",
+        ],
+        _exit_long_action,
+    )
+)
+_COMMENT_ACTIONS.update(
+    dict.fromkeys(
+        ["Exit fifty at two x", "long exit fifty at three x"], _half_exit_action
+    )
+)
+
+
 def order_king_executer(result):
 
     if result:
-        print(result)
-        logging.info(f"result data: {result}")
+        logger.info("result data: %s", result)
         exchange = result["exchange"]
         main_symbol = result["symbol"]
         buyfut = int(result["buyfut"])
@@ -384,17 +806,22 @@ def order_king_executer(result):
         comment = result["comment"]
         open_price = float(result["open_price"])
         order_type = result["order_type"]
-        print("Extracted Values:")
-        print("Symbol:", main_symbol)
-        print("Position Size:", position_size)
-        print("Comment:", comment)
-        print("Open Price:", open_price)
-        print("exchnage :", exchange)
+        logger.debug(
+            "Extracted values: symbol=%s position_size=%s comment=%s "
+            "open_price=%s exchange=%s buyfut=%s",
+            main_symbol,
+            position_size,
+            comment,
+            open_price,
+            exchange,
+            buyfut,
+        )
 
-        logging.info(f"buyfut data: {buyfut},type: {type(buyfut)}")
+        # Stays None when the TradingView symbol cannot be resolved
+        first_symbol = first_symbol_lot = None
 
         if buyfut == 1:
-            print(f"Symbol: {main_symbol} -> use future chart for this")
+            logger.debug("Symbol: %s -> use future chart for this", main_symbol)
             first_symbol, first_symbol_lot = get_future_name(
                 symbol=main_symbol, exchange=exchange
             )
@@ -419,72 +846,250 @@ def order_king_executer(result):
                     date=date,
                 )
             else:
-                print("tradingview symbol not found")
-        print(first_symbol, first_symbol_lot)
+                logger.debug("tradingview symbol not found: %s", main_symbol)
+        logger.debug("Broker symbol: %s lot: %s", first_symbol, first_symbol_lot)
         # first_symbol, first_main_symbol, first_symbol_lot, first_expiry_date, main_ss = getting_strike(symbol=main_symbol, option_type=option_type, strike=strike, date=date)
-        first_symbol = str(first_symbol)
-        first_symbol_lot = int(first_symbol_lot)
-        position_qty = first_symbol_lot * position_size
-
         if first_symbol is not None:
-
-            if comment == "exit all ":
-                print("exit single order called ")
-                exit_single_order(first_symbol)
-            elif (
-                comment == "Remaining Short Exit"
-                or comment == "Stop Loss Short"
-                or comment == "Short SL"
-                or comment == "Short TP"
-                or comment == "Short BE"
-                or comment == "Short Exit"
-                or comment == "Close entry(s) order Short Entry"
-            ):
-                exit_only_sell_trades(symbol=first_symbol)
-            elif (
-                comment == "Stop Loss Long Exit"
-                or comment == "Remaining Long Exit"
-                or comment == "Long SL"
-                or comment == "Long TP"
-                or comment == "Long BE"
-                or comment == "Long Exit"
-                or comment == "Close entry(s) order Long Entry"
-            ):
-                exit_only_buy_trades(symbol=first_symbol)
-
-            elif comment == "Short Entry":
-                print("short entry called ")
-                order_placement_sell_side(
-                    symbol=first_symbol,
-                    qty=position_qty,
-                    limitPrice=open_price,
-                    order_type=order_type,
-                )
-
-            elif comment == "Long Entry":
-                print("long entry called")
-                order_placement_buy_side(
-                    symbol=first_symbol,
-                    qty=position_qty,
-                    limitPrice=open_price,
-                    order_type=order_type,
-                )
-            elif (
-                comment == "Exit fifty at two x"
-                or comment == "long exit fifty at three x"
-            ):
-                print("half qty exit thing called ")
-                exit_half_position(symbol=first_symbol, match_qty=position_qty)
+            first_symbol = str(first_symbol)
+            position_qty = int(first_symbol_lot) * position_size
+
+            action = _COMMENT_ACTIONS.get(comment)
+            if action is not None:
+                # Position read -> decide -> place for one broker symbol at a time
+                with _symbol_lock(first_symbol):
+                    action(first_symbol, position_qty, open_price, order_type)
             else:
-                print("no condition satisfy ")
+                logger.debug("no condition satisfy for comment: %s", comment)
         else:
-            send_telegram_message("first symbol is none ", chat_id=TEST3_CHAT_ID)
+            _notify("first symbol is none ", level="error")
 
     else:
-        print("Message ignored due to missing keywords.")
-        send_telegram_message(
-            "Message ignored due to missing keywords.", chat_id=TEST3_CHAT_ID
+        logger.debug("Message ignored due to missing keywords.")
+        _notify("Message ignored due to missing keywords.", level="debug")
+
+
+# Log in to Fyers as the app loads, so an unusable token fails startup rather
+# than the first trade
+get_fyers()
+
+_ORDER_POOL = ThreadPoolExecutor(max_workers=ORDER_WORKERS, thread_name_prefix="order")
+
+# Job ids returned in the 202 ack so a webhook can be matched to its worker log lines
+_job_ids = itertools.count(1)
+
+
+def _process_trade(parsed_data, job_id=None):
+    """Persist and execute a parsed trade; runs on the order worker pool"""
+    try:
+        # Save to CSV
+        logger.info("Job %s: saving trading data to CSV", job_id)
+        if not save_to_csv(parsed_data):
+            logger.error("Failed to save CSV data")
+            _notify("⚠️ Warning: Failed to save trade data to CSV", level="error")
+        else:
+            logger.info("Trading data saved to CSV successfully")
+
+        # Execute trading logic
+        logger.info("Job %s: executing trading order", job_id)
+        order_king_executer(parsed_data)
+        _notify("✅ Trading order processed successfully", level="debug")
+
+    except Exception as e:
+        logger.error("Job %s: error processing trading data: %s", job_id, e, exc_info=True)
+        # Errors are not held back by the batch window
+        _notify(f"❌ Trading error: {str(e)}", level="error")
+        _tg_flush(TEST3_CHAT_ID)
+
+
+# Warm the symbol master cache off the startup path
+threading.Thread(target=preload_symbol_masters, name="symbol-preload", daemon=True).start()
+
+
+# Pre-serialized bodies for responses whose content never changes
+_NOT_FOUND_BODY = b'{"error":"Endpoint not found"}\n'
+_METHOD_NOT_ALLOWED_BODY = b'{"error":"Method not allowed"}\n'
+_INTERNAL_ERROR_BODY = b'{"error":"Internal server error"}\n'
+_HEALTH_CHECK_BODY = b'{"status":"ok","message":"Health check processed"}\n'
+_TOO_LARGE_BODY = b'{"error":"Message too large"}\n'
+
+
+def _json_response(body, status):
+    """Wrap a pre-serialized JSON body without going through jsonify"""
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+_WEBHOOK_DEDUP_MAX = 4096
+_recent_webhooks = collections.OrderedDict()
+_recent_webhooks_lock = threading.Lock()
+
+
+def _is_duplicate_webhook(body):
+    """Record a webhook body and report whether the same body arrived within WEBHOOK_DEDUP_TTL"""
+    key = hashlib.blake2b(body, digest_size=16).digest()
+    now = time.monotonic()
+
+    with _recent_webhooks_lock:
+        # Entries are kept in arrival order, so expired ones are always at the front
+        while _recent_webhooks:
+            oldest_key, seen_at = next(iter(_recent_webhooks.items()))
+            if now - seen_at < WEBHOOK_DEDUP_TTL:
+                break
+            del _recent_webhooks[oldest_key]
+
+        if key in _recent_webhooks:
+            return True
+
+        _recent_webhooks[key] = now
+        if len(_recent_webhooks) > _WEBHOOK_DEDUP_MAX:
+            _recent_webhooks.popitem(last=False)
+        return False
+
+
+# Keepalive pings; answered without touching Telegram
+_HEALTH_COMMANDS = ("hii", "hello")
+_HEALTH_PING_MAX_BYTES = 64
+
+
+def _is_health_ping(body):
+    """True for a bare hii/hello text body or a {"command": "hii"|"hello"} JSON body"""
+    text = body.strip().lower()
+    if text.startswith(b"{"):
+        try:
+            data = app.json.loads(text)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and data.get("command") in _HEALTH_COMMANDS
+    return text.decode("utf-8", "replace") in _HEALTH_COMMANDS
+
+
+def _has_valid_signature():
+    """Check the request's HMAC signature (always passes when WEBHOOK_SECRET is unset)"""
+    if _WEBHOOK_SECRET_BYTES is None:
+        return True
+
+    signature = request.headers.get("X-Webhook-Signature", "")
+    expected = hmac.new(_WEBHOOK_SECRET_BYTES, request.get_data(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+# Parsed fields stamped by the server rather than taken from the payload
+_SERVER_STAMPED_FIELDS = ("time_utc", "time_ist")
+
+# Per-alert fields a payload may carry (an alert/order id or TradingView's
+# {{timenow}}), checked in meta first and then at the top level
+_ALERT_ID_FIELDS = ("alert_id", "order_id", "timenow", "time")
+
+
+def _alert_id(json_data):
+    """Return (field, value) for the first per-alert identifier in the payload, or None"""
+    meta = json_data.get("meta")
+    for source in (meta if isinstance(meta, dict) else {}, json_data):
+        for field in _ALERT_ID_FIELDS:
+            value = source.get(field)
+            if value not in (None, ""):
+                return field, value
+    return None
+
+
+def _is_duplicate_trade(json_data, parsed_data):
+    """Same as _is_duplicate_webhook, keyed on the payload's alert id and the parsed trade
+
+    Without an alert id there is nothing to tell a redelivery from a genuine
+    re-entry, so only the raw-body check applies.
+    """
+    alert_id = _alert_id(json_data)
+    if alert_id is None:
+        return False
+
+    key = repr(
+        (
+            alert_id,
+            sorted(
+                (field, value)
+                for field, value in parsed_data.items()
+                if field not in _SERVER_STAMPED_FIELDS
+            ),
         )
+    )
+    if not _is_duplicate_webhook(key.encode("utf-8")):
+        return False
+
+    logger.warning("Duplicate trade for alert %s=%s dropped: %s", alert_id[0], alert_id[1], parsed_data)
+    return True
+
+
+def _duplicate_response():
+    logger.warning("Duplicate webhook delivery ignored")
+    return jsonify({"status": "duplicate", "message": "Duplicate webhook ignored"}), 200
+
+
+def _health_command():
+    logger.info("Health check received")
+    return _json_response(_HEALTH_CHECK_BODY, 200)
+
+
+def _exit_all_command():
+    logger.info("Exit all command received")
+    _notify("Executing exit all positions command")
+    try:
+        exit_all_order()
+        _notify("✅ Exit all positions completed")
+    except Exception as e:
+        logger.error("Failed to exit all positions: %s", e)
+        _notify(f"❌ Exit all positions failed: {str(e)}", level="error")
+    return jsonify({"status": "ok", "message": "Exit all processed"}), 200
+
+
+def _cancel_all_command():
+    logger.info("Cancel all command received")
+    _notify("Executing cancel all orders command")
+    try:
+        cancel_orders_for_all()
+        _notify("✅ Cancel all orders completed")
+    except Exception as e:
+        logger.error("Failed to cancel all orders: %s", e)
+        _notify(f"❌ Cancel all orders failed: {str(e)}", level="error")
+    return jsonify({"status": "ok", "message": "Cancel all processed"}), 200
+
+
+# Lower-cased command (JSON "command" field or whole text body) -> handler
+_COMMANDS = {
+    "hii": _health_command,
+    "hello": _health_command,
+    "exit all": _exit_all_command,
+    "cancel all": _cancel_all_command,
+}
+# Same table keyed by bytes, so plain-text commands match without decoding the body
+_COMMANDS_BYTES = {command.encode("ascii"): handler for command, handler in _COMMANDS.items()}
+
+
+def _queue_trade(parsed_data, accepted_message):
+    """Shared tail of the JSON and text webhook paths: hand the trade to the pool"""
+    if not parsed_data:
+        # Nothing to do: an empty 204 skips building a JSON body
+        logger.info("Message did not match trading pattern - no action taken")
+        return "", 204
+
+    if _tg_enabled("debug"):
+        confirmation_msg = f"📊 Parsed data: {_preview(parsed_data)}..."
+        _notify(confirmation_msg, level="debug")
+
+    # Save to CSV and execute trading logic on the worker pool
+    job_id = next(_job_ids)
+    _ORDER_POOL.submit(_process_trade, parsed_data, job_id)
+    return (
+        jsonify({"status": "accepted", "message": accepted_message, "job_id": job_id}),
+        202,
+    )
+
+
+@app.before_request
+def _reject_oversize_body():
+    # Checked from the Content-Length header, so the body is never buffered
+    content_length = request.content_length
+    if content_length is not None and content_length > MAX_WEBHOOK_BYTES:
+        logger.warning("Request body too large (%d bytes)", content_length)
+        abort(413)
 
 
 @app.route("/", methods=["GET"])
@@ -496,298 +1101,143 @@ def home():
 def process_message():
     """Process webhook messages with comprehensive error handling and validation (JSON format)"""
     try:
+        if not _has_valid_signature():
+            logger.warning("Rejected webhook with missing or invalid signature")
+            return jsonify({"error": "Invalid signature"}), 401
+
+        # Uptime checkers hit this often: answer tiny hii/hello pings before any
+        # JSON handling or Telegram traffic
+        content_length = request.content_length
+        if (
+            content_length is not None
+            and content_length < _HEALTH_PING_MAX_BYTES
+            and _is_health_ping(request.get_data())
+        ):
+            logger.info("Health check received")
+            return _json_response(_HEALTH_CHECK_BODY, 200)
+
         # Check if request is JSON
         if request.is_json:
+            # One read of the body serves both the parser and the dedup key
+            raw_data = request.get_data()
             try:
-                json_data = request.get_json()
-                logger.info(f"Received JSON webhook data")
-                logger.info(f"JSON content: {json_data}")
+                json_data = app.json.loads(raw_data)
+                logger.info("Received JSON webhook data")
+                logger.debug("JSON content: %s", json_data)
             except Exception as e:
-                logger.error(f"Failed to parse JSON: {e}")
+                logger.error("Failed to parse JSON: %s", e)
                 return jsonify({"error": "Invalid JSON format"}), 400
 
             # Handle simple commands in JSON format
             if "command" in json_data:
-                command = json_data["command"].lower()
-
-                if command in ["hii", "hello"]:
-                    response_msg = f"{command} - Fyers Trading script is operational"
-                    send_telegram_message(response_msg, chat_id=TEST3_CHAT_ID)
-                    return (
-                        jsonify({"status": "ok", "message": "Health check processed"}),
-                        200,
-                    )
-
-                elif command == "exit all":
-                    logger.info("Exit all command received")
-                    send_telegram_message(
-                        "Executing exit all positions command", chat_id=TEST3_CHAT_ID
-                    )
-                    try:
-                        exit_all_order()
-                        send_telegram_message(
-                            "✅ Exit all positions completed", chat_id=TEST3_CHAT_ID
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to exit all positions: {e}")
-                        send_telegram_message(
-                            f"❌ Exit all positions failed: {str(e)}",
-                            chat_id=TEST3_CHAT_ID,
-                        )
-                    return (
-                        jsonify({"status": "ok", "message": "Exit all processed"}),
-                        200,
-                    )
-
-                elif command == "cancel all":
-                    logger.info("Cancel all command received")
-                    send_telegram_message(
-                        "Executing cancel all orders command", chat_id=TEST3_CHAT_ID
-                    )
-                    try:
-                        cancel_orders_for_all()
-                        send_telegram_message(
-                            "✅ Cancel all orders completed", chat_id=TEST3_CHAT_ID
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to cancel all orders: {e}")
-                        send_telegram_message(
-                            f"❌ Cancel all orders failed: {str(e)}",
-                            chat_id=TEST3_CHAT_ID,
-                        )
-                    return (
-                        jsonify({"status": "ok", "message": "Cancel all processed"}),
-                        200,
-                    )
-
-            # Send notification to Telegram
-            notification_msg = f"📨 JSON Webhook received: {str(json_data)[:300]}..."
-            send_telegram_message(notification_msg, chat_id=TEST3_CHAT_ID)
+                handler = _COMMANDS.get(json_data["command"].lower())
+                if handler is not None:
+                    return handler()
+
+            if _is_duplicate_webhook(raw_data):
+                return _duplicate_response()
+
+            # Send notification to Telegram (batched with the status lines below)
+            if _tg_enabled("debug"):
+                notification_msg = f"📨 JSON Webhook received: {_preview(json_data)}..."
+                _notify(notification_msg, level="debug")
 
             # Parse JSON trading message
             parsed_data = parse_json_message(json_data)
-            logger.info(f"Parsed data: {parsed_data}")
-
-            if parsed_data:
-                try:
-                    # Send parsed data confirmation
-                    confirmation_msg = f"📊 Parsed data: {str(parsed_data)[:300]}..."
-                    send_telegram_message(confirmation_msg, chat_id=TEST3_CHAT_ID)
-
-                    # Save to CSV
-                    logger.info("Saving trading data to CSV")
-                    if not save_to_csv(parsed_data):
-                        logger.error("Failed to save CSV data")
-                        send_telegram_message(
-                            "⚠️ Warning: Failed to save trade data to CSV",
-                            chat_id=TEST3_CHAT_ID,
-                        )
-                    else:
-                        logger.info("Trading data saved to CSV successfully")
-
-                    # Execute trading logic
-                    logger.info("Executing trading order")
-                    order_king_executer(parsed_data)
-                    send_telegram_message(
-                        "✅ Trading order processed successfully", chat_id=TEST3_CHAT_ID
-                    )
-
-                except Exception as e:
-                    error_msg = f"Error processing trading data: {str(e)}"
-                    logger.error(error_msg)
-                    send_telegram_message(
-                        f"❌ Trading error: {str(e)}", chat_id=TEST3_CHAT_ID
-                    )
-                    return (
-                        jsonify(
-                            {"error": "Trading processing failed", "details": str(e)}
-                        ),
-                        500,
-                    )
-            else:
-                logger.info("Message did not match trading pattern - no action taken")
-                return (
-                    jsonify(
-                        {
-                            "status": "ok",
-                            "message": "Message processed but no trading action required",
-                        }
-                    ),
-                    200,
-                )
+            logger.info("Parsed data: %s", parsed_data)
 
-            return (
-                jsonify(
-                    {"status": "success", "message": "JSON Trading message processed"}
-                ),
-                200,
-            )
+            # Replays of one alert that differ in fields the parser ignores
+            # still describe the same trade
+            if parsed_data and _is_duplicate_trade(json_data, parsed_data):
+                return _duplicate_response()
+
+            return _queue_trade(parsed_data, "JSON Trading message queued")
 
         else:
             # Fallback to legacy text format
-            if not request.data:
+            raw_data = request.get_data()
+            if not raw_data:
                 logger.warning("Empty request received")
                 return jsonify({"error": "Empty request"}), 400
 
+            logger.info("Received legacy text webhook data (length: %d)", len(raw_data))
+
+            # Commands are plain ASCII: match them on the raw bytes before decoding
+            handler = _COMMANDS_BYTES.get(raw_data.lower())
+            if handler is not None:
+                return handler()
+
+            if _is_duplicate_webhook(raw_data):
+                return _duplicate_response()
+
             try:
-                text_data = request.data.decode("utf-8")
+                text_data = raw_data.decode("utf-8")
             except UnicodeDecodeError:
                 logger.error("Invalid UTF-8 encoding in request")
                 return jsonify({"error": "Invalid encoding"}), 400
 
-            if len(text_data) > 10000:
-                logger.warning("Request data too large")
-                return jsonify({"error": "Message too large"}), 400
-
-            logger.info(f"Received legacy text webhook data (length: {len(text_data)})")
-
-            message_lower = text_data.lower()
-
-            if message_lower in ["hii", "hello"]:
-                response_msg = f"{message_lower} - Trading script is operational"
-                send_telegram_message(response_msg, chat_id=TEST3_CHAT_ID)
-                return (
-                    jsonify({"status": "ok", "message": "Health check processed"}),
-                    200,
-                )
-
-            elif message_lower == "exit all":
-                logger.info("Exit all command received")
-                send_telegram_message(
-                    "Executing exit all positions command", chat_id=TEST3_CHAT_ID
-                )
-                try:
-                    exit_all_order()
-                    send_telegram_message(
-                        "✅ Exit all positions completed", chat_id=TEST3_CHAT_ID
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to exit all positions: {e}")
-                    send_telegram_message(
-                        f"❌ Exit all positions failed: {str(e)}", chat_id=TEST3_CHAT_ID
-                    )
-                return jsonify({"status": "ok", "message": "Exit all processed"}), 200
-
-            elif message_lower == "cancel all":
-                logger.info("Cancel all command received")
-                send_telegram_message(
-                    "Executing cancel all orders command", chat_id=TEST3_CHAT_ID
+            if _tg_enabled("debug"):
+                # Built in one f-string; the slice is a no-op for short payloads
+                notification_msg = (
+                    f"📨 Webhook received: {text_data[:500]}"
+                    f"{'...' if len(text_data) > 500 else ''}"
                 )
-                try:
-                    cancel_orders_for_all()
-                    send_telegram_message(
-                        "✅ Cancel all orders completed", chat_id=TEST3_CHAT_ID
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to cancel all orders: {e}")
-                    send_telegram_message(
-                        f"❌ Cancel all orders failed: {str(e)}", chat_id=TEST3_CHAT_ID
-                    )
-                return jsonify({"status": "ok", "message": "Cancel all processed"}), 200
-
-            notification_msg = (
-                text_data[:500] + "..." if len(text_data) > 500 else text_data
-            )
-            send_telegram_message(
-                f"📨 Webhook received: {notification_msg}", chat_id=TEST3_CHAT_ID
-            )
+                _notify(notification_msg, level="debug")
 
+            # parse_message rejects non-trading chatter before its regex scan
             parsed_data = parse_message(text_data)
 
-            if parsed_data:
-                try:
-                    confirmation_msg = f"📊 Parsed data: {str(parsed_data)[:300]}..."
-                    send_telegram_message(confirmation_msg, chat_id=TEST3_CHAT_ID)
-
-                    logger.info("Saving trading data to CSV")
-                    if not save_to_csv(parsed_data):
-                        logger.error("Failed to save CSV data")
-                        send_telegram_message(
-                            "⚠️ Warning: Failed to save trade data to CSV",
-                            chat_id=TEST3_CHAT_ID,
-                        )
-
-                    logger.info("Executing trading order")
-                    order_king_executer(parsed_data)
-                    send_telegram_message(
-                        "✅ Trading order processed successfully", chat_id=TEST3_CHAT_ID
-                    )
-
-                except Exception as e:
-                    error_msg = f"Error processing trading data: {str(e)}"
-                    logger.error(error_msg)
-                    send_telegram_message(
-                        f"❌ Trading error: {str(e)}", chat_id=TEST3_CHAT_ID
-                    )
-                    return (
-                        jsonify(
-                            {"error": "Trading processing failed", "details": str(e)}
-                        ),
-                        500,
-                    )
-            else:
-                logger.info("Message did not match trading pattern - no action taken")
-                return (
-                    jsonify(
-                        {
-                            "status": "ok",
-                            "message": "Message processed but no trading action required",
-                        }
-                    ),
-                    200,
-                )
-
-            return (
-                jsonify({"status": "success", "message": "Trading message processed"}),
-                200,
-            )
+            return _queue_trade(parsed_data, "Trading message queued")
 
     except Exception as e:
-        error_message = f"Unexpected error in webhook processing: {str(e)}"
-        logger.error(error_message, exc_info=True)
-        send_telegram_message(
-            f"🚨 Critical error in webhook: {str(e)}", chat_id=TEST3_CHAT_ID
-        )
+        logger.error("Unexpected error in webhook processing: %s", e, exc_info=True)
+        _notify(f"🚨 Critical error in webhook: {str(e)}", level="error")
         return jsonify({"error": "Internal server error", "message": str(e)}), 500
 
 
 @app.errorhandler(404)
 def not_found(error):
-    return jsonify({"error": "Endpoint not found"}), 404
+    return _json_response(_NOT_FOUND_BODY, 404)
 
 
 @app.errorhandler(405)
 def method_not_allowed(error):
-    return jsonify({"error": "Method not allowed"}), 405
+    return _json_response(_METHOD_NOT_ALLOWED_BODY, 405)
+
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return _json_response(_TOO_LARGE_BODY, 413)
 
 
 @app.errorhandler(500)
 def internal_error(error):
-    logger.error(f"Internal server error: {error}")
-    return jsonify({"error": "Internal server error"}), 500
+    logger.error("Internal server error: %s", error)
+    return _json_response(_INTERNAL_ERROR_BODY, 500)
 
 
 if __name__ == "__main__":
-    try:
-        # Update symbol data on startup
-        logger.info("Updating symbol data on startup...")
-        nfo_update()
-        logger.info("Symbol data updated successfully")
+    # The Werkzeug server handles one webhook at a time; it is for local development only
+    if not os.getenv("USE_DEV_SERVER"):
+        sys.exit(
+            "Run under a production server: gunicorn -c gunicorn.conf.py main:app "
+            "(or python run_waitress.py). Set USE_DEV_SERVER=1 to use the Flask dev server."
+        )
 
-        # Initialize Fyers login
-        logger.info("Initializing Fyers authentication...")
-        from fyerslogin import auto_login
+    try:
+        # Update symbol data and initialize Fyers login concurrently
+        from run_waitress import initialize_app
 
-        auto_login()
-        logger.info("Fyers authentication completed")
+        initialize_app()
 
-        # Start the Flask application
-        logger.info(f"Starting Flask application on {FLASK_HOST}:{FLASK_PORT}")
+        # Start the Flask development server
+        logger.info("Starting Flask application on %s:%s", FLASK_HOST, FLASK_PORT)
         app.run(
             host=FLASK_HOST,
             port=FLASK_PORT,
             debug=False,  # Never run debug in production
+            threaded=True,
         )
     except Exception as e:
-        logger.critical(f"Failed to start application: {e}")
+        logger.critical("Failed to start application: %s", e)
         sys.exit(1)
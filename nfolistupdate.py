@@ -1,6 +1,111 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Symbol files downloaded today and younger than this many seconds are reused
+NFO_CACHE_TTL = int(os.getenv("NFO_CACHE_TTL", 8 * 3600))
+
+# ETag/Last-Modified and time of the last download per URL, for conditional
+# GETs and the freshness check
+NFO_VALIDATORS_FILE = ".nfo_cache.json"
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def is_fresh(local_file_path, cached):
+    """True if the local symbol file was fetched today and is within NFO_CACHE_TTL
+
+    Goes by the recorded download time, not the file mtime: the symbol files are
+    tracked in git, so a checkout or pull stamps stale copies with "now".
+    """
+    downloaded_at = cached.get("downloaded_at")
+    if downloaded_at is None or not os.path.exists(local_file_path):
+        return False
+    if datetime.fromtimestamp(downloaded_at).date() != date.today():
+        return False
+    return time.time() - downloaded_at < NFO_CACHE_TTL
+
+
+def load_validators():
+    try:
+        with open(NFO_VALIDATORS_FILE) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_validators(validators):
+    try:
+        with open(NFO_VALIDATORS_FILE, "w") as file:
+            json.dump(validators, file)
+    except OSError as e:
+        print(f"Could not save {NFO_VALIDATORS_FILE}: {e}")
+
+
+def download_file(session, url, local_file_path, validators, force=False):
+    """Fetch one symbol file; returns True if a new copy was written"""
+    cached = validators.get(url, {})
+    if not force and is_fresh(local_file_path, cached):
+        print(f"File '{local_file_path}' is up to date, skipping download.")
+        return False
+
+    # Ask the server to answer 304 if the copy on disk is still current
+    headers = {}
+    if not force and os.path.exists(local_file_path):
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
 
-def nfo_update():
+    # Per-process name so concurrent updaters never write the same temp file
+    tmp_path = f"{local_file_path}.tmp.{os.getpid()}"
+    try:
+        # Send an HTTP GET request to the URL
+        with session.get(url, headers=headers, timeout=60, stream=True) as response:
+            if response.status_code == 304:
+                # The server just confirmed this copy, so it counts as fetched now
+                validators[url] = dict(cached, downloaded_at=time.time())
+                print(f"File '{local_file_path}' unchanged on server, skipping download.")
+                return False
+
+            # Check if the request was successful
+            if response.status_code == 200:
+                # Stream to a temp file and swap it in, so readers never see a
+                # partially written symbol file. No fsync: after a crash the file
+                # is simply downloaded again
+                with open(tmp_path, "wb") as file:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        file.write(chunk)
+                os.replace(tmp_path, local_file_path)
+                validators[url] = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "downloaded_at": time.time(),
+                }
+                # requests asks for gzip by default and iter_content decompresses it;
+                # log what the server actually sent
+                encoding = response.headers.get("Content-Encoding", "identity")
+                print(f"File '{local_file_path}' downloaded successfully ({encoding}).")
+                return True
+            print(f"Failed to download {url}. Status code: {response.status_code}")
+    except Exception as e:
+        print(f"An error occurred while downloading {url}: {e}")
+        # Drop a partial download; the previous copy stays in place
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+    return False
+
+
+def nfo_update(force=False):
         
     # List of URLs and corresponding local file paths
     files_to_download = {
@@ -12,20 +117,40 @@ def nfo_update():
         "https://public.fyers.in/sym_details/BSE_FO.csv" : "BSE_FO.csv"
     }
     
-    # Loop through each URL and file path
-    for url, local_file_path in files_to_download.items():
-        try:
-            # Send an HTTP GET request to the URL
-            response = requests.get(url)
-    
-            # Check if the request was successful
-            if response.status_code == 200:
-                # Save the file locally
-                with open(local_file_path, "wb") as file:
-                    file.write(response.content)
-                print(f"File '{local_file_path}' downloaded successfully.")
-            else:
-                print(f"Failed to download {url}. Status code: {response.status_code}")
-        except Exception as e:
-            print(f"An error occurred while downloading {url}: {e}")
+    workers = len(files_to_download)
+    validators = load_validators()
+
+    # All files come from the same host, so one keep-alive session serves them all;
+    # the pool holds one connection per parallel download
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=workers,
+            pool_maxsize=workers,
+            max_retries=Retry(total=3, backoff_factor=0.3),
+        ),
+    )
+
+    # Downloads are network bound, so fetch them all at once instead of one by one
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(
+                lambda item: download_file(
+                    session, item[0], item[1], validators, force
+                ),
+                files_to_download.items(),
+            )
+        )
+
+    session.close()
+    updated = any(results)
+    # A 304 also refreshes downloaded_at, so save even when nothing new landed
+    save_validators(validators)
+
+    # Lookups cached from the previous files are stale once new ones land; only
+    # relevant if the trading helpers are already loaded in this process
+    helper = sys.modules.get("fyres_strategy_helper")
+    if updated and helper is not None:
+        helper.clear_symbol_caches()
     
\ No newline at end of file
@@ -1,9 +1,19 @@
 from waitress import serve
+import atexit
 import logging
 import os
+import queue
 import sys
 import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+from telegram_limiter import wait_for_chat
 
 # Load environment variables
 load_dotenv()
@@ -14,32 +24,113 @@ logger = logging.getLogger(__name__)
 # Global flag to track if server is shutting down
 shutting_down = False
 
-
-def send_telegram_message(message):
+# Set in forked worker processes; only the parent sends lifecycle notices
+is_worker_process = False
+
+# Worker processes forked by the parent, signalled when it shuts down
+worker_pids = []
+
+# Pause before replacing a worker that died, so a crash loop cannot spin
+WORKER_RESPAWN_DELAY = 1
+
+
+# Telegram credentials and endpoint are fixed for the life of the process
+TOKEN_TELEGRAM = os.getenv("TELEGRAM_TOKEN")
+TEST3_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_URL = f"https://api.telegram.org/bot{TOKEN_TELEGRAM}/sendMessage"
+
+# Keep-alive session so successive notices skip the TLS handshake
+_tg_session = requests.Session()
+_tg_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=2,
+        # Lifecycle notices are few; ride out failed connects and 429s, but not
+        # 5xx or read timeouts, after which the notice may already be delivered
+        max_retries=Retry(
+            total=2,
+            read=0,
+            other=0,
+            backoff_factor=0.2,
+            status_forcelist=(429,),
+            allowed_methods=None,
+        ),
+    ),
+)
+
+
+def _send_telegram_now(message):
     """Send a message to Telegram via the Bot API."""
     try:
-        import urllib.parse
-        import requests
-
-        TOKEN_TELEGRAM = os.getenv("TELEGRAM_TOKEN")
-        TEST3_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
         if not TOKEN_TELEGRAM or not TEST3_CHAT_ID:
             logger.error("Telegram credentials not configured")
             return False
 
-        formatted_message = urllib.parse.quote_plus(str(message))
-        send_text = f"https://api.telegram.org/bot{TOKEN_TELEGRAM}/sendMessage?chat_id={TEST3_CHAT_ID}&text={formatted_message}"
-
-        response = requests.get(send_text, timeout=5)
+        # Spaced against every sender in the process, not just this module's
+        wait_for_chat(TEST3_CHAT_ID)
+        response = _tg_session.post(
+            TELEGRAM_URL,
+            data={"chat_id": TEST3_CHAT_ID, "text": str(message)},
+            timeout=5,
+        )
         response.raise_for_status()
         logger.info("Telegram notification sent successfully")
         return True
     except Exception as e:
-        logger.error(f"Failed to send Telegram message: {e}")
+        logger.error("Failed to send Telegram message: %s", e)
+        return False
+
+
+# Lifecycle notices are handed to a background sender so startup and signal
+# handling never wait on api.telegram.org
+_tg_queue = queue.Queue(maxsize=100)
+
+# Upper bound on how long exit waits to deliver queued notices
+TELEGRAM_DRAIN_TIMEOUT = 5
+
+
+def send_telegram_message(message):
+    """Queue a Telegram notice; returns False if the queue is full"""
+    if is_worker_process:
+        return False
+    try:
+        _tg_queue.put_nowait(message)
+        return True
+    except queue.Full:
+        logger.warning("Telegram queue full, dropping message")
         return False
 
 
+def _tg_send_loop():
+    while True:
+        message = _tg_queue.get()
+        try:
+            _send_telegram_now(message)
+        finally:
+            _tg_queue.task_done()
+
+
+def _drain_telegram():
+    """Deliver queued notices (e.g. the shutdown message) before the process exits"""
+    deadline = time.monotonic() + TELEGRAM_DRAIN_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            message = _tg_queue.get_nowait()
+        except queue.Empty:
+            # Queue is empty; wait only for a send the worker already has in flight
+            if not _tg_queue.unfinished_tasks:
+                break
+            time.sleep(0.05)
+            continue
+        _send_telegram_now(message)
+        _tg_queue.task_done()
+
+
+threading.Thread(target=_tg_send_loop, name="telegram-lifecycle", daemon=True).start()
+atexit.register(_drain_telegram)
+
+
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
     global shutting_down
@@ -47,7 +138,12 @@ def signal_handler(signum, frame):
         return
 
     shutting_down = True
-    logger.warning(f"Received signal {signum} - shutting down gracefully")
+    logger.warning("Received signal %s - shutting down gracefully", signum)
+    for pid in worker_pids:
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
     send_telegram_message("🛑 Trading server is shutting down (Signal received)")
     sys.exit(0)
 
@@ -58,6 +154,93 @@ def register_signal_handlers():
     signal.signal(signal.SIGINT, signal_handler)
 
 
+BANNER_RULE = "=" * 60
+
+
+def print_block(*lines):
+    """Print console banner lines with one write and one flush"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def fork_worker():
+    """Fork one worker process; returns True in the child"""
+    global is_worker_process
+    pid = os.fork()
+    if pid == 0:
+        is_worker_process = True
+        worker_pids.clear()
+        return True
+    worker_pids.append(pid)
+    return False
+
+
+def fork_workers(processes):
+    """Fork that many worker processes; returns True in the children"""
+    for _ in range(processes):
+        if fork_worker():
+            return True
+    return False
+
+
+def supervise_workers():
+    """Reap workers as they die and fork replacements
+
+    Returns only in a replacement worker. The parent stays here until a signal
+    shuts it down; signal_handler forwards that signal to the workers.
+    """
+    while True:
+        pid, status = os.wait()
+        if pid not in worker_pids:
+            continue
+        worker_pids.remove(pid)
+        logger.error(
+            "Worker %s exited with status %s; starting a replacement",
+            pid,
+            os.waitstatus_to_exitcode(status),
+        )
+        send_telegram_message(f"⚠️ Server worker {pid} died; starting a replacement")
+        time.sleep(WORKER_RESPAWN_DELAY)
+        if fork_worker():
+            return
+
+
+def announce_startup(host, port, threads, processes):
+    """Print the startup banner and send the startup notice"""
+    print_block(
+        "\n" + BANNER_RULE,
+        "🚀 Trading Bot Server Starting...",
+        BANNER_RULE,
+        f"📍 Server Address: http://{host}:{port}",
+        f"🔧 Worker Threads: {threads} x {processes} process(es)",
+        "📊 Endpoints:",
+        "   • POST /fyers - Fyers trading webhook",
+        BANNER_RULE,
+        "✓ Server is ready to accept requests",
+        "✓ Press Ctrl+C to stop the server",
+        BANNER_RULE + "\n",
+    )
+
+    startup_msg = (
+        f"🚀 Trading server has started successfully!\n\n"
+        f"📍 Server: http://{host}:{port}\n"
+        f"🔧 Threads: {threads} x {processes} process(es)\n"
+        f"📊 Fyers Webhook: /fyers\n"
+    )
+    send_telegram_message(startup_msg)
+
+
+def reuseport_socket(host, port):
+    """Listening socket for one of several processes bound to the same port; the
+    kernel spreads incoming connections across them"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+
 def initialize_app():
     """Initialize all services before starting server"""
     try:
@@ -65,19 +248,31 @@ def initialize_app():
         logger.info("Starting application initialization...")
         logger.info("=" * 60)
 
-        # Update symbol data
-        logger.info("Step 1/3: Updating NFO symbol data...")
         from nfolistupdate import nfo_update
-
-        nfo_update()
-        logger.info("✓ NFO symbol data updated successfully")
-
-        # Initialize Fyers
-        logger.info("Step 2/3: Initializing Fyers authentication...")
         from fyerslogin import auto_login
 
-        auto_login()
-        logger.info("✓ Fyers authentication completed")
+        # Symbol download and Fyers login are independent network steps, run them together
+        logger.info("Updating NFO symbol data and initializing Fyers authentication...")
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="init") as executor:
+            nfo_future = executor.submit(nfo_update)
+            login_future = executor.submit(auto_login)
+
+            failures = []
+            try:
+                nfo_future.result()
+                logger.info("✓ NFO symbol data updated successfully")
+            except Exception as e:
+                logger.error("✗ NFO symbol data update failed: %s", e)
+                failures.append(e)
+            try:
+                login_future.result()
+                logger.info("✓ Fyers authentication completed")
+            except Exception as e:
+                logger.error("✗ Fyers authentication failed: %s", e)
+                failures.append(e)
+
+        if failures:
+            raise failures[0]
 
         logger.info("=" * 60)
         logger.info("✓ All services initialized successfully!")
@@ -86,7 +281,7 @@ def initialize_app():
 
     except Exception as e:
         logger.error("=" * 60)
-        logger.error(f"✗ Initialization failed: {e}")
+        logger.error("✗ Initialization failed: %s", e)
         logger.error("=" * 60)
         raise
 
@@ -99,42 +294,42 @@ if __name__ == "__main__":
         # Initialize services first
         initialize_app()
 
-        # Import app AFTER initialization
-        from main import app
-
         # Get configuration from environment
         host = os.getenv("FLASK_HOST", "0.0.0.0")
         port = int(os.getenv("FLASK_PORT", 5008))
-        threads = int(os.getenv("WAITRESS_THREADS", 4))
-
-        # Print startup banner
-        print("\n" + "=" * 60)
-        print("🚀 Trading Bot Server Starting...")
-        print("=" * 60)
-        print(f"📍 Server Address: http://{host}:{port}")
-        print(f"🔧 Worker Threads: {threads}")
-        print(f"📊 Endpoints:")
-        print(f"   • POST /fyers - Fyers trading webhook")
-        print("=" * 60)
-        print("✓ Server is ready to accept requests")
-        print("✓ Press Ctrl+C to stop the server")
-        print("=" * 60 + "\n")
-
-        # Send startup notification
-        startup_msg = (
-            f"🚀 Trading server has started successfully!\n\n"
-            f"📍 Server: http://{host}:{port}\n"
-            f"🔧 Threads: {threads}\n"
-            f"📊 Fyers Webhook: /fyers\n"
-        )
-        send_telegram_message(startup_msg)
+        threads = int(os.getenv("WAITRESS_THREADS", 32))
+        connection_limit = int(os.getenv("WAITRESS_CONNECTION_LIMIT", 200))
+        # More than one process sidesteps the GIL, but each keeps its own webhook
+        # dedup window and order locks (same as gunicorn workers)
+        processes = int(os.getenv("WAITRESS_PROCESSES", 1))
+
+        if processes > 1:
+            # Parse the symbol masters once so every fork shares them copy-on-write
+            from fyres_strategy_helper import preload_symbol_masters
+
+            preload_symbol_masters()
+
+            # Workers fork before importing main, whose background threads do not
+            # survive fork; the parent never serves, it only announces and supervises
+            if not fork_workers(processes):
+                announce_startup(host, port, threads, processes)
+                supervise_workers()
+            listen = {"sockets": [reuseport_socket(host, port)]}
+        else:
+            listen = {"host": host, "port": port}
+
+        # Import app AFTER initialization
+        from main import app
+
+        if processes == 1:
+            announce_startup(host, port, threads, processes)
 
         # Start Waitress server
         serve(
             app,
-            host=host,
-            port=port,
+            **listen,
             threads=threads,
+            connection_limit=connection_limit,
             url_scheme="http",
             channel_timeout=120,
             cleanup_interval=30,
@@ -142,19 +337,15 @@ if __name__ == "__main__":
         )
 
     except KeyboardInterrupt:
-        print("\n" + "=" * 60)
-        print("🛑 Server stopped by user (Ctrl+C)")
-        print("=" * 60)
+        print_block("\n" + BANNER_RULE, "🛑 Server stopped by user (Ctrl+C)", BANNER_RULE)
         logger.info("Server stopped by user")
         if not shutting_down:
             send_telegram_message("🛑 Trading server stopped by user (Ctrl+C)")
         sys.exit(0)
 
     except Exception as e:
-        print("\n" + "=" * 60)
-        print(f"❌ Failed to start server: {e}")
-        print("=" * 60)
-        logger.critical(f"Failed to start server: {e}", exc_info=True)
+        print_block("\n" + BANNER_RULE, f"❌ Failed to start server: {e}", BANNER_RULE)
+        logger.critical("Failed to start server: %s", e, exc_info=True)
         send_telegram_message(f"❌ Trading server failed to start: {str(e)}")
         sys.exit(1)
 
@@ -0,0 +1,41 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Telegram allows about one message per second per chat. main.py,
+# fyres_strategy_helper.py and run_waitress.py all post to the same bot and chat,
+# so they share one set of send slots per process
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", 1.0))
+
+_lock = threading.Lock()
+_next_send = {}  # chat_id -> monotonic time its next message may go out
+
+
+def wait_for_chat(chat_id):
+    """Block until a message to chat_id may be sent, then claim that send slot
+
+    A chat that has been idle for TELEGRAM_CHAT_INTERVAL sends at once; otherwise
+    the caller sleeps only for the time left since the previous send.
+    """
+    key = str(chat_id)
+    with _lock:
+        now = time.monotonic()
+        slot = max(now, _next_send.get(key, 0.0))
+        _next_send[key] = slot + TELEGRAM_CHAT_INTERVAL
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def _reset_after_fork():
+    # The lock may have been held by a thread that does not exist in the child
+    global _lock
+    _lock = threading.Lock()
+    _next_send.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)